@@ -0,0 +1,102 @@
+"""
+Isla Bot: Reporting functionality for a Terraria Server
+Copyright (C) 2020 Rina
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from types import SimpleNamespace
+
+import discord
+from discord.ext import commands
+
+from isla.isla import Isla
+
+
+WORDS = 'the a griefer base chest spawn lol who broke my house again r tp home pls staff help ok brb'.split()
+
+COMMANDS = ['r!report info bob', 'r!report list', 'r!report id 12', 'r!help']
+
+
+def make_corpus(count, seed=0):
+    """Ordinary chat with a few commands and bot messages mixed in, like the server's channels."""
+
+    generator = random.Random(seed)
+    channel = SimpleNamespace(id=1)
+    guild = SimpleNamespace(id=1, owner_id=0)
+
+    messages = []
+    for id in range(count):
+        roll = generator.random()
+        if roll < 0.02:
+            content = generator.choice(COMMANDS)
+        else:
+            content = ' '.join(generator.choices(WORDS, k=generator.randint(1, 12)))
+
+        author = SimpleNamespace(id=generator.randint(1, 50), bot=roll > 0.95)
+        messages.append(
+            SimpleNamespace(id=id, content=content, author=author, guild=guild, channel=channel, _state=None)
+        )
+
+    return messages
+
+
+def make_bot():
+    kwargs = {'command_prefix': 'r!'}
+    # discord.py 2.x requires intents, versions before 1.5 don't have them
+    if hasattr(discord, 'Intents'):
+        kwargs['intents'] = discord.Intents.default()
+
+    bot = commands.Bot(**kwargs)
+    bot._connection.user = SimpleNamespace(id=0)
+    return bot
+
+
+async def main(args):
+    messages = make_corpus(args.messages)
+    bot = make_bot()
+    # The pre-filter only needs the attributes Isla.__init__ sets up for it
+    filters = SimpleNamespace(prefixes=('r!',), allowed_channels=frozenset())
+
+    async def before():
+        for message in messages:
+            await bot.get_context(message)
+
+    async def after():
+        for message in messages:
+            if Isla.wants(filters, message):
+                await bot.get_context(message)
+
+    for label, run in (('get_context on every message', before), ('pre-filter, then get_context', after)):
+        best = float('inf')
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            await run()
+            best = min(best, time.perf_counter() - start)
+        print(f'{label:<30} {best / len(messages) * 1e6:7.2f} µs per message')
+
+    passed = sum(Isla.wants(filters, message) for message in messages)
+    print(f'{passed} of {len(messages)} messages reach get_context with the pre-filter.')
+    print(f'discord.py {discord.__version__}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Per-message cost of Isla.on_message with and without the pre-filter.')
+    parser.add_argument('--messages', type=int, default=20_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,94 @@
+"""
+Isla Bot: Reporting functionality for a Terraria Server
+Copyright (C) 2020 Rina
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import asyncio
+import time
+
+import asyncpg
+
+from isla import queries
+from isla.isla import load_config
+
+
+async def get_calls(connection):
+    """Get (name, query, args) for each hot statement, with arguments taken from the data already there."""
+
+    report = await connection.fetchrow('SELECT id, username FROM staff_reports ORDER BY id DESC LIMIT 1;')
+    if report is None:
+        raise SystemExit('staff_reports is empty, import some reports first.')
+
+    return [
+        ('profile', queries.PROFILE, (report['username'],)),
+        ('search', queries.SEARCH, (report['username'], report['username'], 10)),
+        ('report by id', queries.REPORT_BY_ID, (report['id'],)),
+        ('reaction roles', queries.REACTION_ROLES, ()),
+        (
+            'insert report',
+            queries.INSERT_REPORT,
+            ('benchmark', 'other', '0', None, 0, [], None, None),
+        ),
+    ]
+
+
+async def run(connection, calls, number):
+    results = {}
+
+    # Inserts are rolled back so the benchmark leaves no rows behind, only a gap in the id sequence
+    transaction = connection.transaction()
+    await transaction.start()
+    try:
+        for name, query, args in calls:
+            await connection.fetch(query, *args)
+
+            start = time.perf_counter()
+            for _ in range(number):
+                await connection.fetch(query, *args)
+            results[name] = (time.perf_counter() - start) / number
+    finally:
+        await transaction.rollback()
+
+    return results
+
+
+async def main(args):
+    postgres = load_config(args.config)['postgres']
+
+    # statement_cache_size=0 makes asyncpg parse and describe every statement again on each call
+    uncached = await asyncpg.connect(**postgres, statement_cache_size=0)
+    cached = await asyncpg.connect(**postgres)
+
+    try:
+        calls = await get_calls(cached)
+        before = await run(uncached, calls, args.number)
+        after = await run(cached, calls, args.number)
+    finally:
+        await uncached.close()
+        await cached.close()
+
+    print(f'{"statement":<16} {"unprepared ms":>14} {"prepared ms":>12} {"saved":>7}')
+    for name, _, _ in calls:
+        saved = 1 - after[name] / before[name]
+        print(f'{name:<16} {before[name] * 1000:14.3f} {after[name] * 1000:12.3f} {saved:7.0%}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the hot statements with and without statement reuse.')
+    parser.add_argument('--config', default='config.yaml')
+    parser.add_argument('--number', type=int, default=500)
+    asyncio.run(main(parser.parse_args()))
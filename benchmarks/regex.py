@@ -0,0 +1,71 @@
+"""
+Isla Bot: Reporting functionality for a Terraria Server
+Copyright (C) 2020 Rina
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import random
+import re
+import timeit
+
+from common.regex import extract_links, time_date, time_dh
+
+
+# The regexes as they were before common/regex.py was fixed
+OLD_URL_GRABBER = re.compile(r""""/^((?:https?|steam):\/\/[^\s<]+[^<.,:;"'\]\s])/""")
+OLD_TIME_DH = re.compile(r'^([0-9]|[0-9][0-9]|[0-9][0-9][0-9]|[0-9][0-9][0-9][0-9])d([0-9]|0[0-9]|1[0-9]|2[0-3])h')
+OLD_TIME_DATE = re.compile(r'^([1-9]|0[1-9]|[1-2][0-9]|3[0-1])/(1[0-2]|0?[1-9])')
+
+
+def time_corpus(count, seed=0):
+    generator = random.Random(seed)
+    return [''.join(generator.choices('0123456789dh/', k=generator.randint(1, 10))) for _ in range(count)]
+
+
+def bench(label, function, number):
+    seconds = min(timeit.repeat(function, number=number, repeat=5)) / number
+    print(f'{label:<32} {seconds * 1000:8.3f} ms')
+
+
+def main(args):
+    with open(args.corpus, encoding='utf-8') as f:
+        text = f.read()
+
+    print(f'Links in {args.corpus} ({len(text) // 1024} KB)')
+    old, new = len(OLD_URL_GRABBER.findall(text)), len(extract_links(text))
+    print(f'  old url_grabber found {old}, extract_links found {new}')
+    bench('  old url_grabber', lambda: OLD_URL_GRABBER.findall(text), args.number)
+    bench('  extract_links', lambda: extract_links(text), args.number)
+
+    times = time_corpus(args.times)
+    mismatches = sum(
+        old.findall(value) != new.findall(value)
+        for value in times
+        for old, new in ((OLD_TIME_DH, time_dh), (OLD_TIME_DATE, time_date))
+    )
+    print(f'Time regexes over {len(times)} random strings, {mismatches} differences')
+    bench('  old time_dh', lambda: [OLD_TIME_DH.findall(value) for value in times], args.number)
+    bench('  time_dh', lambda: [time_dh.findall(value) for value in times], args.number)
+    bench('  old time_date', lambda: [OLD_TIME_DATE.findall(value) for value in times], args.number)
+    bench('  time_date', lambda: [time_date.findall(value) for value in times], args.number)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the old and new link and time regexes on a corpus.')
+    parser.add_argument('corpus', nargs='?', default='reports.csv')
+    parser.add_argument('--times', type=int, default=100_000)
+    parser.add_argument('--number', type=int, default=3)
+    main(parser.parse_args())
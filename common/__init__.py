@@ -15,4 +15,4 @@ GNU Affero General Public License for more details.
 You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
-from .regex import time_date, time_dh, url_grabber
+from .regex import extract_links, time_date, time_dh, url_grabber
@@ -18,8 +18,18 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 import re
 
 
-url_grabber = re.compile(r""""/^((?:https?|steam):\/\/[^\s<]+[^<.,:;"'\]\s])/""")
+# Links anywhere in a message, minus trailing punctuation, the <> used to hide embeds and unbalanced closing
+# parentheses like the one around markdown links. A link can still end in a balanced (...) group.
+url_grabber = re.compile(r'''(?:https?|steam)://(?:[^\s<>()]|\([^\s<>()]*\)|\()+(?<![.,:;"'\]])''')
 
-time_dh = re.compile(r'^([0-9]|[0-9][0-9]|[0-9][0-9][0-9]|[0-9][0-9][0-9][0-9])d([0-9]|0[0-9]|1[0-9]|2[0-3])h')
+# XXXXdXXh, days 0-9999 and hours 0-23
+time_dh = re.compile(r'^([0-9]{1,4})d([01]?[0-9]|2[0-3])h')
 
-time_date = re.compile(r'^([1-9]|0[1-9]|[1-2][0-9]|3[0-1])/(1[0-2]|0?[1-9])')
+# DD/MM, months are tried longest first so 1/12 is December and not January
+time_date = re.compile(r'^(0?[1-9]|[12][0-9]|3[01])/(1[0-2]|0?[1-9])')
+
+
+def extract_links(text, attachments=()):
+    """Get every link in text followed by the attachment urls, in order and without duplicates."""
+
+    return list(dict.fromkeys([*url_grabber.findall(text), *(attachment.url for attachment in attachments)]))
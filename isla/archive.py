@@ -0,0 +1,261 @@
+"""
+Isla Bot: Reporting functionality for a Terraria Server
+Copyright (C) 2020 Rina
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import pathlib
+import tempfile
+from collections import Counter
+
+import aiohttp
+
+
+log = logging.getLogger(__name__)
+
+MAX_SIZE = 25 * 1024 * 1024
+
+# Statuses that mean the link is gone for good, anything else is retried by the next backfill
+PERMANENT_STATUSES = frozenset({403, 404, 410})
+
+BACKFILL_PAGE_SIZE = 500
+
+
+class FetchError(Exception):
+    def __init__(self, message, permanent=False):
+        super().__init__(message)
+        self.permanent = permanent
+
+
+class HTTPFetcher:
+    """Download proof over HTTP. Anything with an async fetch(url) -> (data, content_type) can replace it."""
+
+    def __init__(self, timeout=30, max_size=MAX_SIZE):
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_size = max_size
+        self.session = None
+
+    async def fetch(self, url):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(timeout=self.timeout)
+
+        async with self.session.get(url) as response:
+            if response.status != 200:
+                raise FetchError(f'HTTP {response.status}', permanent=response.status in PERMANENT_STATUSES)
+
+            if response.content_length and response.content_length > self.max_size:
+                raise FetchError(f'{response.content_length} bytes is too large', permanent=True)
+
+            data = await response.content.read(self.max_size + 1)
+            if len(data) > self.max_size:
+                raise FetchError('Too large', permanent=True)
+
+            return data, response.content_type
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+class Archiver:
+    """
+    Copy proof links into a local content-addressed store, so they outlive the CDN.
+
+    Files are named after the sha256 of their content, so the same screenshot posted
+    on several reports is only stored once. Links are downloaded by a fixed number of
+    workers from a bounded queue, and every link's outcome is recorded in proof_archive.
+    """
+
+    def __init__(self, bot, path='archive', workers=4, queue_size=1000, fetcher=None):
+        self.bot = bot
+        self.path = pathlib.Path(path)
+        self.workers = workers
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.fetcher = fetcher or HTTPFetcher()
+
+        self.tasks = []
+        self.backfill_task = None
+        self.stats = Counter()
+
+        # Called with the sha256 of every newly archived link
+        self.listeners = []
+
+    @classmethod
+    def from_config(cls, bot, config):
+        if config is None:
+            return None
+        return cls(bot, **config)
+
+    def path_for(self, sha256):
+        return self.path / sha256[:2] / sha256
+
+    def start(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.tasks = [self.bot.loop.create_task(self.worker()) for _ in range(self.workers)]
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+        if self.backfill_task is not None:
+            self.backfill_task.cancel()
+        await self.fetcher.close()
+
+    def submit(self, urls):
+        """Queue links without waiting, links that don't fit in the queue are left for the backfill."""
+
+        for url in urls:
+            try:
+                self.queue.put_nowait(url)
+            except asyncio.QueueFull:
+                self.stats['dropped'] += 1
+
+    def start_backfill(self):
+        """Start queueing unarchived report links in the background, returning False if a backfill is running."""
+
+        if self.backfill_task is not None and not self.backfill_task.done():
+            return False
+
+        self.backfill_task = self.bot.loop.create_task(self.backfill())
+        return True
+
+    async def backfill(self):
+        """Queue every report link that hasn't been archived yet, waiting for room in the queue."""
+
+        # Links with a row are either archived or gone for good, only transient failures are left unrecorded.
+        # Paged by report id so that no connection or snapshot is held while waiting on the queue.
+        last_id = 0
+        seen = set()
+
+        try:
+            while True:
+                records = await self.bot.pool.fetch(
+                    '''
+                    SELECT id, ARRAY(
+                        SELECT link.url
+                            FROM unnest(image_links) AS link(url)
+                            WHERE NOT EXISTS (SELECT 1 FROM proof_archive WHERE proof_archive.url = link.url)
+                    ) AS urls
+                        FROM staff_reports
+                        WHERE id > $1
+                        ORDER BY id
+                        LIMIT $2;
+                    ''',
+                    last_id,
+                    BACKFILL_PAGE_SIZE,
+                )
+                if not records:
+                    break
+
+                last_id = records[-1]['id']
+                for record in records:
+                    for url in record['urls']:
+                        if url not in seen:
+                            seen.add(url)
+                            await self.queue.put(url)
+                            self.stats['backfilled'] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.exception('Archive backfill stopped early.')
+
+        log.info(f'Archive backfill queued {len(seen)} links.')
+        return len(seen)
+
+    async def worker(self):
+        while True:
+            url = await self.queue.get()
+            try:
+                await self.archive(url)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception(f'Unable to archive {url}.')
+            finally:
+                self.queue.task_done()
+
+    async def archive(self, url):
+        """Archive a link now, returning the sha256 of its content or None if it couldn't be downloaded."""
+
+        known = await self.bot.pool.fetchval(
+            'SELECT sha256 FROM proof_archive WHERE url = $1 AND sha256 IS NOT NULL;', url
+        )
+        if known:
+            self.stats['known'] += 1
+            return known
+
+        try:
+            data, content_type = await self.fetcher.fetch(url)
+        except (FetchError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # Only links that are gone for good are recorded, timeouts and server errors are retried later
+            if not getattr(e, 'permanent', False):
+                self.stats['failed'] += 1
+                return None
+
+            self.stats['lost'] += 1
+            await self.bot.pool.execute(
+                '''
+                INSERT INTO proof_archive (url, error)
+                    VALUES ($1, $2)
+                    ON CONFLICT (url) DO UPDATE SET error = excluded.error, archived_at = current_timestamp;
+                ''',
+                url,
+                str(e) or type(e).__name__,
+            )
+            return None
+
+        sha256 = hashlib.sha256(data).hexdigest()
+        path = self.path_for(sha256)
+
+        if path.exists():
+            self.stats['duplicate'] += 1
+        else:
+            await self.bot.loop.run_in_executor(None, write_file, path, data)
+            self.stats['stored'] += 1
+
+        await self.bot.pool.execute(
+            '''
+            INSERT INTO proof_archive (url, sha256, size, content_type)
+                VALUES ($1, $2, $3, $4)
+                ON CONFLICT (url) DO UPDATE
+                    SET sha256 = excluded.sha256,
+                        size = excluded.size,
+                        content_type = excluded.content_type,
+                        error = NULL,
+                        archived_at = current_timestamp;
+            ''',
+            url,
+            sha256,
+            len(data),
+            content_type,
+        )
+
+        for listener in self.listeners:
+            listener(sha256)
+
+        return sha256
+
+
+def write_file(path, data):
+    # Written under a temporary name first, so a crash never leaves a truncated file under a real hash
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=path.parent, suffix='.tmp', delete=False) as f:
+        f.write(data)
+    os.replace(f.name, path)
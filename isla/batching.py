@@ -0,0 +1,96 @@
+"""
+Isla Bot: Reporting functionality for a Terraria Server
+Copyright (C) 2020 Rina
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import logging
+
+
+log = logging.getLogger(__name__)
+
+MAX_BACKOFF = 300
+
+
+class BatchWriter:
+    """
+    Collect changes in memory and write them to the database in the background.
+
+    Subclasses keep the pending changes and implement take, write and restore. A batch is
+    written delay seconds after the first change in it, or straight away through flush. A
+    batch that can't be written is restored and retried with backoff, up to max_retries times.
+    """
+
+    description = 'changes'
+
+    def __init__(self, bot, delay=2.0, max_retries=8):
+        self.bot = bot
+        self.delay = delay
+        self.max_retries = max_retries
+
+        self.lock = asyncio.Lock()
+        self.timer = None
+        self.failures = 0
+
+    def take(self):
+        """Remove and return everything pending."""
+        raise NotImplementedError
+
+    async def write(self, batch):
+        raise NotImplementedError
+
+    def restore(self, batch):
+        """Put a batch that couldn't be written back in front of anything pending."""
+        raise NotImplementedError
+
+    def give_up(self, batch):
+        log.exception(f'Unable to save {len(batch)} {self.description}, giving up.')
+
+    def schedule(self, delay=None):
+        if self.timer is None:
+            delay = self.delay if delay is None else delay
+            self.timer = self.bot.loop.call_later(delay, lambda: self.bot.loop.create_task(self.flush()))
+
+    def cancel(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+    async def flush(self):
+        self.cancel()
+
+        async with self.lock:
+            batch = self.take()
+            if not batch:
+                return
+
+            try:
+                await self.write(batch)
+            except Exception:
+                self.failures += 1
+                if self.failures > self.max_retries:
+                    self.give_up(batch)
+                    self.failures = 0
+                    return
+
+                log.exception(f'Unable to save {len(batch)} {self.description}, retrying.')
+                self.restore(batch)
+
+                # Replaces any timer set while writing, so the backoff decides when the next try happens
+                self.cancel()
+                self.schedule(min(self.delay * 2 ** self.failures, MAX_BACKOFF))
+            else:
+                self.failures = 0
@@ -0,0 +1,145 @@
+"""
+Isla Bot: Reporting functionality for a Terraria Server
+Copyright (C) 2020 Rina
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import csv
+import datetime
+import io
+
+import ruamel.yaml
+
+from .context import parse_time_date, parse_time_dh, punishments, types
+from .importer import parse_array
+
+
+COLUMNS = ('username', 'type', 'staff', 'summary', 'blocks', 'image_links', 'happened_at', 'punishment')
+
+MAX_ROWS = 1000
+
+
+def read_rows(filename, data):
+    """Read report rows from the bytes of a .csv or .yaml attachment."""
+
+    text = data.decode('utf-8-sig')
+
+    if filename.lower().endswith('.csv'):
+        return list(csv.DictReader(io.StringIO(text)))
+
+    if filename.lower().endswith(('.yaml', '.yml')):
+        rows = ruamel.yaml.YAML(typ='safe').load(text)
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ValueError('The YAML file has to be a list of reports.')
+        return rows
+
+    raise ValueError('Attach a .csv or .yaml file.')
+
+
+def parse_date(value):
+    if isinstance(value, datetime.date):
+        return value
+
+    value = str(value).strip()
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        return parse_time_dh(value) or parse_time_date(value)
+
+
+def parse_links(value):
+    if not value:
+        return []
+    if isinstance(value, list):
+        return [str(link) for link in value]
+    # YAML can give numbers, dates or mappings here, none of which are links
+    if not isinstance(value, str):
+        raise ValueError(f'Expected links, got {type(value).__name__}')
+    if value.startswith('{'):
+        return parse_array(value)
+    return value.split()
+
+
+def validate_row(row, staff):
+    """Turn a row into a staff_reports record, returning (record, problems)."""
+
+    row = {str(key).strip().lower(): value for key, value in row.items() if key is not None}
+    problems = []
+
+    username = str(row.get('username') or '').strip()
+    if not username:
+        problems.append('username is missing')
+
+    type = str(row.get('type') or '').strip().lower()
+    if type not in types:
+        problems.append(f'"{type}" is not a type')
+
+    punishment = str(row.get('punishment') or '').strip().lower() or None
+    if punishment is not None and punishment not in punishments:
+        problems.append(f'"{punishment}" is not a punishment')
+
+    blocks = row.get('blocks')
+    if blocks in (None, ''):
+        blocks = 0 if type == 'hack' else None
+    if blocks is None:
+        problems.append('blocks is missing')
+    else:
+        try:
+            blocks = int(blocks)
+        except (TypeError, ValueError):
+            problems.append(f'"{blocks}" is not a block count')
+
+    happened_at = row.get('happened_at')
+    if happened_at not in (None, ''):
+        happened_at = parse_date(happened_at)
+        if happened_at is None:
+            problems.append(f'"{row["happened_at"]}" is not a date')
+    else:
+        happened_at = None
+
+    try:
+        image_links = parse_links(row.get('image_links'))
+    except ValueError:
+        problems.append('image_links could not be read')
+        image_links = []
+
+    summary = str(row.get('summary') or '').strip() or None
+
+    record = (username, type, staff, summary, blocks, image_links, happened_at, punishment)
+    return record, problems
+
+
+def validate_rows(rows, staff, start=1):
+    """Validate every row, returning the valid records and a list of (row number, problems)."""
+
+    if len(rows) > MAX_ROWS:
+        raise ValueError(f'Only {MAX_ROWS} reports can be submitted at once.')
+
+    records = []
+    errors = []
+
+    for number, row in enumerate(rows, start=start):
+        record, problems = validate_row(row, staff)
+        if problems:
+            errors.append((number, problems))
+        else:
+            records.append(record)
+
+    return records, errors
+
+
+async def insert_reports(connection, records):
+    async with connection.transaction():
+        await connection.copy_records_to_table('staff_reports', records=records, columns=COLUMNS)
@@ -0,0 +1,105 @@
+"""
+Isla Bot: Reporting functionality for a Terraria Server
+Copyright (C) 2020 Rina
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import tabulate
+from discord.ext import commands
+
+from isla.isla import is_staff
+
+
+class Debug(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+    @commands.group()
+    @is_staff()
+    async def debug(self, ctx):
+        if ctx.invoked_subcommand:
+            return
+        await ctx.send_help(ctx.command)
+
+    @debug.command()
+    @is_staff()
+    async def limits(self, ctx):
+        limiter = self.bot.limiter
+
+        table = tabulate.tabulate(sorted(limiter.stats.items()), headers=['outcome', 'commands'])
+        await ctx.send(
+            f'```\n{table}```Policy: {limiter.policy}, {limiter.max_concurrency} running per user. '
+            f'{len(limiter.active)} users running commands, {len(limiter.waiters)} with queued commands.'
+        )
+
+    @debug.command()
+    @is_staff()
+    async def archive(self, ctx, action=None):
+        archiver = self.bot.archiver
+        if archiver is None:
+            return await ctx.send('Proof archiving is not configured.')
+
+        if action == 'backfill':
+            if not archiver.start_backfill():
+                return await ctx.send('A backfill is already running.')
+            return await ctx.send(
+                f'Queueing every report link that has not been archived yet in the background, '
+                f'use {ctx.prefix}debug archive to follow it.'
+            )
+
+        table = tabulate.tabulate(sorted(archiver.stats.items()), headers=['outcome', 'links'])
+        await ctx.send(
+            f'```\n{table}```{archiver.queue.qsize()} links waiting, stored in {archiver.path}. '
+            f'{len(self.bot.proof_index.hashes)} files hashed for duplicate detection.'
+        )
+
+    @debug.command()
+    @is_staff()
+    async def queries(self, ctx, count: int = 10):
+        query_log = self.bot.pool.query_log
+        rows = [
+            (
+                stats.calls,
+                f'{stats.mean * 1000:.1f}',
+                f'{stats.max * 1000:.1f}',
+                stats.rows,
+                stats.command,
+                shorten(key),
+            )
+            for key, stats in query_log.slowest(count)
+        ]
+
+        table = tabulate.tabulate(rows, headers=['calls', 'mean ms', 'max ms', 'rows', 'slowest from', 'statement'])
+        await ctx.send_all(
+            f'Slowest {len(rows)} of {len(query_log.statements)} statements, '
+            f'logging anything over {query_log.threshold * 1000:.0f} ms.\n```\n{table}```'
+        )
+
+    @debug.command()
+    @is_staff()
+    async def startup(self, ctx):
+        timings = self.bot.startup_timings
+        rows = [(name, f'{seconds * 1000:.0f}') for name, seconds in timings.items()]
+
+        table = tabulate.tabulate(rows, headers=['phase', 'ms'])
+        await ctx.send(f'```\n{table}```Started in {sum(timings.values()):.2f} s.')
+
+
+def shorten(text, width=60):
+    return text if len(text) <= width else text[:width - 3] + '...'
+
+
+def setup(bot):
+    bot.add_cog(Debug(bot))
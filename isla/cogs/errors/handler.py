@@ -24,7 +24,16 @@ import logging
 import discord
 from discord.ext import commands
 
-from isla.errors import NoImageLinks, NoReportFound, UserCancellation
+from isla import metrics
+from isla.errors import (
+    InvalidInput,
+    NoImageLinks,
+    NoReportFound,
+    NoRollbackFound,
+    RollbackAlreadyFilled,
+    SessionTimeout,
+    UserCancellation,
+)
 from .formatting import remove_accents
 from .utils import converter_name, get_context
 
@@ -59,6 +68,7 @@ def get_message(ctx, error):
     handler = get_handler(error)
 
     if handler is not None:
+        metrics.errors.inc(handler.__name__)
         return handler(ctx, error)
 
 
@@ -67,11 +77,31 @@ def handle_user_cancellation(ctx, error):
     return 'Successfully cancelled.'
 
 
+@add_handler(SessionTimeout)
+def handle_session_timeout(ctx, error):
+    return 'Cancelled, you took too long to answer.'
+
+
+@add_handler(InvalidInput)
+def handle_invalid_input(ctx, error):
+    return remove_accents(error)
+
+
 @add_handler(NoReportFound)
 def handle_no_report_found(ctx, error):
     return 'No report by that ID was found!'
 
 
+@add_handler(NoRollbackFound)
+def handle_no_rollback_found(ctx, error):
+    return 'No rollback by that ID was found!'
+
+
+@add_handler(RollbackAlreadyFilled)
+def handle_rollback_already_filled(ctx, error):
+    return 'That rollback has already been reported!'
+
+
 @add_handler(NoImageLinks)
 def handle_no_image_links(ctx, error):
     return "There's no image links to remove for this report!"
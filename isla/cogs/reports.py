@@ -15,29 +15,34 @@ GNU Affero General Public License for more details.
 You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
+import asyncio
+import csv
 import datetime
 import importlib
+import logging
 import sys
+import tempfile
+import time
+from collections import OrderedDict
 
 import discord
+import ruamel.yaml
 import tabulate
 from discord.ext import commands
 
-from isla.context import Context, punishments, types
+from isla import queries
+from isla.bulk import insert_reports, read_rows, validate_rows
+from isla.context import Context, add_reactions, parse_quick_report, punishments, types
+from isla.drafts import DraftStore
+from isla.exporter import FORMATS, build_query, export_reports
 from isla.isla import is_staff
+from isla.rollbacks import RollbackWriter, compile_pattern, parse_rollbacks
+from isla.search import UserSearch
 
-from isla.errors import NoReportFound, UserCancellation
+from isla.errors import InvalidInput, NoReportFound, NoRollbackFound, RollbackAlreadyFilled, UserCancellation
 
 
-'''= SEMI AUTO REPORTING SUBCOMMANDS =
-[{prefix}report create (rollback id)]
-Used in conjunction with a rollback id of a grief you fixed on the server. This shows the info for the rollback, and then has you fill in the non automatic details such as proof (image links) and the punishment (if you haven't punished yet, say "skip" to do it later).
-[{prefix}report add (report id) (rollback id)]
-If you had to use /rollback multiple times on a single grief, you can use this to add more to the existing report
-[{prefix}report list rollbacks]
-Used to get a list of the rollbacks you haven't reported for yet. If you aren't logged into Discord with the Terraria server bots, use {prefix}report list rollbacks public to see a list of reports made that weren't linked to Discord accounts.
-[{prefix}report list (page number)]
-Brings up a list of reports sorted by ID. 25 reports per page. Not giving a page number shows the latest page.'''
+log = logging.getLogger(__name__)
 
 reports_help = '''```asciidoc
 = MANUAL REPORTING SUBCOMMANDS =
@@ -45,84 +50,156 @@ reports_help = '''```asciidoc
 Used to create a report. Functions exactly like the old report command.
 [{prefix}report edit (report id)]
 Used to edit a report.
+[{prefix}report quick (username) (type) (time) (blocks) (punishment) "(summary)"]
+Creates a report from one message. Time is XXdXXh or DD/MM, and punishment and summary are optional.
+[{prefix}report bulk]
+Creates a report for every row of an attached .csv or .yaml file with username, type, happened_at, blocks, punishment, summary and image_links columns.
+[{prefix}report resume]
+Continues the report you were making or editing when the bot restarted or you stopped answering.
+= SEMI AUTO REPORTING SUBCOMMANDS =
+[{prefix}report create (rollback id)]
+Used in conjunction with a rollback id of a grief you fixed on the server. This shows the info for the rollback, and then has you fill in the non automatic details such as proof (image links) and the punishment (if you haven't punished yet, press the ✅ to do it later).
+[{prefix}report add (report id) (rollback id)]
+If you had to use /rollback multiple times on a single grief, you can use this to add more to the existing report.
+[{prefix}report list rollbacks]
+Used to get a list of the rollbacks you haven't reported for yet. If you aren't logged into Discord with the Terraria server bots, use {prefix}report list rollbacks public to see a list of rollbacks made that weren't linked to Discord accounts.
 = LISTING SUBCOMMANDS =
 [{prefix}report id (report id)]
 Shows information tied to a report id.
 [{prefix}report info (username)]
 Shows information on a rule-breaker and any past offenses they may have.
+[{prefix}report search (text)]
+Finds usernames similar to the text, or reports with the text in their summary.
+[{prefix}report list (page number)]
+Brings up a list of reports sorted by ID. 25 reports per page. Not giving a page number shows the latest page.
+[{prefix}report export (csv/jsonl) (filters)]
+Sends a compressed dump of reports. Filters: user=name type=grief from=YYYY-MM-DD to=YYYY-MM-DD staff=@mention
 ```
 '''
 
+REPORTS_PER_PAGE = 25
+
+# Profiles also change outside the cog (importer, psql), so cached ones expire. Unknown usernames expire sooner.
+PROFILE_CACHE_SIZE = 256
+PROFILE_TTL = 600
+MISSING_PROFILE_TTL = 60
+
+PREVIOUS_PAGE = '◀'
+NEXT_PAGE = '▶'
+
 
 class reports(commands.Cog, name='reports'):
     def __init__(self, bot):
         self.bot = bot
 
-    async def get_info_embed(self, username):
-        reports = await self.bot.pool.fetch(
-            '''
-            SELECT * FROM staff_reports
-            WHERE username = $1
-            ORDER BY id ASC;
-            ''',
-            username,
-        )
+        # username -> (expiry, aggregated report data or None for unknown usernames), least recently used first
+        self.profiles = OrderedDict()
+        self.user_search = UserSearch(bot)
 
-        if not reports:
-            return None
+        self.rollback_pattern = compile_pattern(bot.config['server'].get('rollback_pattern'))
+        self.rollback_writer = RollbackWriter(bot)
+        self.drafts = DraftStore(bot)
 
-        def check(x, y):
-            if x[y]:
-                if y == 'happened_at':
-                    return (
-                        datetime.datetime.combine(x[y], datetime.time(hour=0, minute=0, second=0))
-                        - datetime.datetime(year=1, month=1, day=1, hour=0, minute=0, second=0)
-                    ).total_seconds()
-                if y == 'created_at':
-                    return (
-                        x[y] - datetime.datetime(year=1, month=1, day=1, hour=0, minute=0, second=0)
-                    ).total_seconds()
-            else:
-                return 0
+    def invalidate_profile(self, *usernames):
+        for username in usernames:
+            self.profiles.pop(username.lower(), None)
 
-        try:
-            latest_created = sorted(reports, key=lambda r: check(r, 'created_at'), reverse=True)[0][
-                'created_at'
-            ].strftime('%d %b %Y at %I:%M %p.')
-            latest_created = f'Latest report: {latest_created}\n'
-        except:
-            latest_created = ''
+        self.user_search.clear()
+
+    async def get_profile(self, username):
+        """Get the aggregated report data for a username, cached until one of their reports changes or it expires."""
+
+        key = username.lower()
+        now = time.monotonic()
 
         try:
-            latest_happened = sorted(reports, key=lambda r: check(r, 'happened_at'), reverse=True)[0][
-                'happened_at'
-            ].strftime('%d %b %Y')
-            latest_happened = f'Latest offense: {latest_happened}\n'
-        except:
-            latest_happened = ''
+            expiry, profile = self.profiles[key]
+        except KeyError:
+            pass
+        else:
+            if expiry > now:
+                self.profiles.move_to_end(key)
+                return profile
+            del self.profiles[key]
 
-        offenses = await self.bot.pool.fetch(
-            '''
-            SELECT DISTINCT type
-            FROM staff_reports
-            WHERE username = $1
-            ''',
-            username,
+        profile = await self.fetch_profile(username)
+
+        self.profiles[key] = (now + (PROFILE_TTL if profile else MISSING_PROFILE_TTL), profile)
+        if len(self.profiles) > PROFILE_CACHE_SIZE:
+            self.profiles.popitem(last=False)
+
+        return profile
+
+    async def fetch_profile(self, username):
+        # Per-type and per-user aggregates are computed alongside each row in a single round-trip
+        reports = await self.bot.pool.fetch(queries.PROFILE, username)
+
+        if not reports:
+            return None
+
+        by_type = {}
+        for report in reports:
+            by_type.setdefault(report['type'], report)
+
+        def aggregate(type, key):
+            return by_type[type][key] if type in by_type else 0
+
+        table = tabulate.tabulate(
+            [
+                [
+                    report['id'],
+                    report['type'],
+                    str(report['blocks']),
+                    report['happened_at'].strftime('%d %b %Y') if report['happened_at'] else '',
+                    report['created_at'].strftime('%d %b %Y') if report['created_at'] else '',
+                ]
+                for report in reports
+            ],
+            headers=['id', 'type', 'blocks', 'happened_at', 'reported on'],
         )
 
-        offenses = ', '.join([types[i['type']] for i in offenses])
+        return {
+            'offenses': list(by_type),
+            'griefs': aggregate('grief', 'type_count'),
+            'tunnels': aggregate('tunnel', 'type_count'),
+            'blocks_griefs': aggregate('grief', 'type_blocks'),
+            'blocks_tunnels': aggregate('tunnel', 'type_blocks'),
+            'average_griefs': int(aggregate('grief', 'type_average')),
+            'average_tunnels': int(aggregate('tunnel', 'type_average')),
+            'latest_created': reports[0]['latest_created'],
+            'latest_happened': reports[0]['latest_happened'],
+            'punishments': [report['punishment'] for report in reports if report['punishment'] in punishments],
+            'table': table,
+        }
+
+    async def get_info_embed(self, username):
+        profile = await self.get_profile(username)
+
+        if not profile:
+            return None
+
+        offenses = ', '.join([types[i] for i in profile['offenses']])
 
         embed = discord.Embed(title=f'User Info: {username}', description=offenses)
 
-        blocks_griefs = sum([report['blocks'] for report in reports if report['type'] == 'grief'])
-        blocks_tunnels = sum([report['blocks'] for report in reports if report['type'] == 'tunnel'])
-        griefs = sum([1 for report in reports if report['type'] == 'grief'])
-        tunnels = sum([1 for report in reports if report['type'] == 'grief'])
-        punishes = [report['punishment'] for report in reports if report['punishment'] in punishments]
+        latest_created = profile['latest_created']
+        latest_created = (
+            f'Latest report: {latest_created.strftime("%d %b %Y at %I:%M %p.")}\n' if latest_created else ''
+        )
+        latest_happened = profile['latest_happened']
+        latest_happened = f'Latest offense: {latest_happened.strftime("%d %b %Y")}\n' if latest_happened else ''
+
+        punishes = profile['punishments']
 
-        griefed = f'Blocks griefed: {blocks_griefs} broken, {round(blocks_griefs / griefs)} average\n' if griefs else ''
+        griefed = (
+            f'Blocks griefed: {profile["blocks_griefs"]} broken, {profile["average_griefs"]} average\n'
+            if profile['griefs']
+            else ''
+        )
         tunneled = (
-            f'Blocks tunneled: {blocks_tunnels} broken, {round(blocks_tunnels / tunnels)} average\n' if griefs else ''
+            f'Blocks tunneled: {profile["blocks_tunnels"]} broken, {profile["average_tunnels"]} average\n'
+            if profile['tunnels']
+            else ''
         )
         punished = f'Previous punishments: {",".join(punishes)}' if punishes else ''
 
@@ -130,25 +207,84 @@ class reports(commands.Cog, name='reports'):
             name='General Data', value=f'{latest_created}{latest_happened}{griefed}{tunneled}{punished}', inline=False
         )
 
-        embed.add_field(
-            name='List of reports',
-            value='```\n'
-            + tabulate.tabulate(
-                [
-                    [
-                        report['id'],
-                        report['type'],
-                        str(report['blocks']),
-                        report['happened_at'].strftime('%d %b %Y') if report['happened_at'] else '',
-                        report['created_at'].strftime('%d %b %Y') if report['created_at'] else '',
-                    ]
-                    for report in reports
-                ],
-                headers=['id', 'type', 'blocks', 'happened_at', 'reported on'],
+        embed.add_field(name='List of reports', value=f'```\n{profile["table"]}```', inline=False)
+        return embed
+
+    async def fetch_page(self, before=None, after=None, limit=REPORTS_PER_PAGE):
+        """Fetch a page of reports by keyset on id, so late pages cost the same as early ones."""
+
+        if after is not None:
+            rows = await self.bot.pool.fetch(
+                '''
+                SELECT id, username, type, blocks, happened_at
+                    FROM staff_reports
+                    WHERE id > $1
+                    ORDER BY id ASC
+                    LIMIT $2;
+                ''',
+                after,
+                limit,
             )
-            + '```',
-            inline=False,
+            return list(rows)
+
+        # Going backwards (or starting from the latest page) walks the index in reverse
+        rows = await self.bot.pool.fetch(
+            '''
+            SELECT id, username, type, blocks, happened_at
+                FROM staff_reports
+                WHERE $1::int IS NULL OR id < $1
+                ORDER BY id DESC
+                LIMIT $2;
+            ''',
+            before,
+            limit,
         )
+        return list(reversed(rows))
+
+    def format_page(self, rows, page, pages):
+        table = tabulate.tabulate(
+            [
+                [
+                    row['id'],
+                    row['username'][:20] if row['username'] else '',
+                    row['type'],
+                    str(row['blocks']),
+                    row['happened_at'].strftime('%d %b %Y') if row['happened_at'] else '',
+                ]
+                for row in rows
+            ],
+            headers=['id', 'username', 'type', 'blocks', 'happened_at'],
+        )
+        return f'```\n{table}```Page {page}/{pages}'
+
+    async def get_unfilled_rollback(self, id):
+        rollback = await self.bot.pool.fetchrow(
+            '''
+            SELECT *
+                FROM rollbacks
+                WHERE id = $1;
+            ''',
+            id,
+        )
+
+        if not rollback:
+            raise NoRollbackFound('No rollback by that ID was found.')
+
+        if rollback['filled']:
+            raise RollbackAlreadyFilled('That rollback has already been reported.')
+
+        return rollback
+
+    def get_rollback_embed(self, rollback):
+        embed = discord.Embed(
+            title=f"Rollback #{rollback['id']}", description=f"{rollback['username']}'s grief, rolled back"
+        )
+        embed.add_field(name='Blocks', value=rollback['blocks'])
+        embed.add_field(name='Staff', value=rollback['staff'])
+
+        if rollback['happened_at']:
+            embed.add_field(name='Happened at', value=rollback['happened_at'].strftime("%y %b %d %H:%M:%S"))
+
         return embed
 
     @commands.group()
@@ -158,64 +294,240 @@ class reports(commands.Cog, name='reports'):
             return
         await ctx.send(reports_help.format(prefix=ctx.prefix))
 
-    @report.command()
-    @is_staff()
-    async def new(self, ctx: Context):
-        username = await ctx.get_username()
-        type = await ctx.get_type()
+    async def insert_report(self, username, type, staff, summary, blocks, image_links, happened_at, punishment):
+        id = await self.bot.pool.fetchval(
+            queries.INSERT_REPORT,
+            username,
+            type,
+            staff,
+            summary,
+            blocks,
+            image_links,
+            happened_at,
+            punishment,
+        )
+
+        self.invalidate_profile(username)
+        return id
+
+    async def ask(self, ctx, draft, field, prompt, **kwargs):
+        """Prompt for a field unless the draft already has it, checkpointing the draft after each answer."""
+
+        if field not in draft:
+            draft[field] = await prompt(**kwargs)
+            self.drafts.save(ctx.author.id, draft)
+
+        return draft[field]
+
+    async def ask_image_links(self, ctx, draft):
+        """Like ask, but also checkpoints the links after every proof message, so a restart mid-upload keeps them."""
+
+        if 'image_links' not in draft:
+
+            def checkpoint(image_links):
+                draft['partial_image_links'] = image_links
+                self.drafts.save(ctx.author.id, draft)
+
+            draft['image_links'] = await ctx.get_image_links(
+                image_links=draft.get('partial_image_links', []), on_change=checkpoint
+            )
+            draft.pop('partial_image_links', None)
+            self.drafts.save(ctx.author.id, draft)
+
+        return draft['image_links']
+
+    async def fill_new(self, ctx, draft):
+        username = await self.ask(ctx, draft, 'username', ctx.get_username)
+        type = await self.ask(ctx, draft, 'type', ctx.get_type)
 
         embed = await self.get_info_embed(username)
 
         if type in ['grief', 'tunnel']:
-            happened_at = await ctx.get_time_dh()
-            image_links = await ctx.get_image_links()
-            blocks = await ctx.get_blocks_affected()
+            happened_at = await self.ask(ctx, draft, 'happened_at', ctx.get_time_dh)
+            image_links = await self.ask_image_links(ctx, draft)
+            blocks = await self.ask(ctx, draft, 'blocks', ctx.get_blocks_affected)
         elif type == 'hack':
-            happened_at = await ctx.get_time_date()
-            image_links = await ctx.get_image_links()
+            happened_at = await self.ask(ctx, draft, 'happened_at', ctx.get_time_date)
+            image_links = await self.ask_image_links(ctx, draft)
             blocks = 0
         else:
-            happened_at = await ctx.get_time_date()
-            image_links = await ctx.get_image_links()
-            blocks = await ctx.get_blocks_affected()
+            happened_at = await self.ask(ctx, draft, 'happened_at', ctx.get_time_date)
+            image_links = await self.ask_image_links(ctx, draft)
+            blocks = await self.ask(ctx, draft, 'blocks', ctx.get_blocks_affected)
 
         if embed:
             await ctx.send('User is already in database.', embed=embed)
+        else:
+            similar = await self.user_search.search(username, limit=5)
+            if similar:
+                names = ', '.join(f'`{row["username"]}` ({row["reports"]})' for row in similar)
+                await ctx.send(f'Similar users already in database: {names}')
 
-        punishment = await ctx.get_punishment()
+        punishment = await self.ask(ctx, draft, 'punishment', ctx.get_punishment)
 
-        summary = await ctx.get_summary()
+        summary = await self.ask(ctx, draft, 'summary', ctx.get_summary)
 
         reporter = str(ctx.author.id)
 
-        id = await self.bot.pool.fetchval(
-            '''
-            INSERT INTO staff_reports
-            (username, type, staff, summary, blocks, image_links, happened_at, punishment)
-            VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
-            RETURNING id;
-        ''',
-            username,
-            type,
-            reporter,
-            summary,
-            blocks,
-            image_links,
-            happened_at,
-            punishment,
+        id = await self.insert_report(
+            username=username,
+            type=type,
+            staff=reporter,
+            summary=summary,
+            blocks=blocks,
+            image_links=image_links,
+            happened_at=happened_at,
+            punishment=punishment,
         )
 
+        self.drafts.discard(ctx.author.id)
+
         if embed:
             await ctx.send(f'Report saved to ID {id}')
         else:
             embed = await self.get_info_embed(username)
             await ctx.send(f'Report saved to ID {id}', embed=embed)
 
+    @report.command()
+    @is_staff()
+    async def new(self, ctx: Context):
+        await self.fill_new(ctx, {'command': 'new'})
+
+    @report.command()
+    @is_staff()
+    async def quick(self, ctx, *, line):
+        try:
+            report = parse_quick_report(line, [attachment.url for attachment in ctx.message.attachments])
+        except ValueError as e:
+            raise InvalidInput(str(e))
+
+        id = await self.insert_report(staff=str(ctx.author.id), **report)
+
+        if self.bot.archiver:
+            self.bot.archiver.submit(report['image_links'])
+
+        await ctx.send(f'Report saved to ID {id}', embed=await self.get_info_embed(report['username']))
+
+    @report.command()
+    @is_staff()
+    async def bulk(self, ctx):
+        if not ctx.message.attachments:
+            raise InvalidInput('Attach a .csv or .yaml file of reports.')
+
+        attachment = ctx.message.attachments[0]
+
+        try:
+            rows = read_rows(attachment.filename, await attachment.read())
+            # Row 1 of a CSV is the header, so number rows like a spreadsheet does
+            start = 2 if attachment.filename.lower().endswith('.csv') else 1
+            records, errors = validate_rows(rows, str(ctx.author.id), start=start)
+        except (ValueError, UnicodeDecodeError, ruamel.yaml.YAMLError, csv.Error) as e:
+            raise InvalidInput(f'Could not read {attachment.filename}: {e}')
+
+        if records:
+            async with self.bot.pool.acquire() as connection:
+                await insert_reports(connection, records)
+
+            self.invalidate_profile(*{record[0] for record in records})
+
+            if self.bot.archiver:
+                self.bot.archiver.submit(link for record in records for link in record[5])
+
+        summary = f'Saved {len(records)} of {len(rows)} reports.'
+        if errors:
+            problems = '\n'.join(f'Row {number}: {", ".join(row_problems)}' for number, row_problems in errors)
+            summary = f'{summary} These rows were skipped:\n{problems}'
+
+        await ctx.send_all(summary)
+
+    @report.command()
+    @is_staff()
+    async def create(self, ctx: Context, rollback_id: int):
+        rollback = await self.get_unfilled_rollback(rollback_id)
+        username = rollback['username']
+
+        await ctx.send(embed=self.get_rollback_embed(rollback))
+
+        embed = await self.get_info_embed(username)
+        if embed:
+            await ctx.send('User is already in database.', embed=embed)
+
+        image_links = await ctx.get_image_links(image_links=[])
+        punishment = await ctx.get_punishment()
+
+        happened_at = rollback['happened_at'].date() if rollback['happened_at'] else None
+
+        async with self.bot.pool.acquire() as connection:
+            async with connection.transaction():
+                # Re-check inside the transaction, someone else may have reported it while we were prompting
+                filled = await connection.fetchval(
+                    'SELECT filled FROM rollbacks WHERE id = $1 FOR UPDATE;', rollback_id
+                )
+                if filled:
+                    raise RollbackAlreadyFilled('That rollback has already been reported.')
+
+                id = await connection.fetchval(
+                    '''
+                    INSERT INTO staff_reports
+                    (username, type, staff, blocks, image_links, happened_at, punishment, rollbacks)
+                    VALUES ($1, 'grief', $2, $3, $4, $5, $6, ARRAY[$7::int])
+                    RETURNING id;
+                    ''',
+                    username,
+                    str(ctx.author.id),
+                    rollback['blocks'],
+                    image_links,
+                    happened_at,
+                    punishment,
+                    rollback_id,
+                )
+
+                await connection.execute('UPDATE rollbacks SET filled = TRUE WHERE id = $1;', rollback_id)
+
+        self.invalidate_profile(username)
+
+        await ctx.send(f'Report saved to ID {id}', embed=await self.get_info_embed(username))
+
+    @report.command()
+    @is_staff()
+    async def add(self, ctx, report_id: int, rollback_id: int):
+        rollback = await self.get_unfilled_rollback(rollback_id)
+
+        async with self.bot.pool.acquire() as connection:
+            async with connection.transaction():
+                filled = await connection.fetchval(
+                    'SELECT filled FROM rollbacks WHERE id = $1 FOR UPDATE;', rollback_id
+                )
+                if filled:
+                    raise RollbackAlreadyFilled('That rollback has already been reported.')
+
+                username = await connection.fetchval(
+                    '''
+                    UPDATE staff_reports
+                        SET blocks = coalesce(blocks, 0) + $1,
+                            rollbacks = array_append(coalesce(rollbacks, '{}'), $2)
+                        WHERE id = $3
+                        RETURNING username;
+                    ''',
+                    rollback['blocks'] or 0,
+                    rollback_id,
+                    report_id,
+                )
+
+                if username is None:
+                    raise NoReportFound('No report by that ID was found.')
+
+                await connection.execute('UPDATE rollbacks SET filled = TRUE WHERE id = $1;', rollback_id)
+
+        self.invalidate_profile(username)
+
+        await ctx.send(f'Added rollback #{rollback_id} to report {report_id}.')
+
     @commands.Cog.listener()
     @is_staff()
     async def on_message(self, message):
         if message.channel.id == self.bot.config['server']['communication_channel_id']:
-            pass  # TODO: Program auto reporting
+            self.rollback_writer.add(parse_rollbacks(message.content, message.created_at, self.rollback_pattern))
 
     @report.command()
     @is_staff()
@@ -227,17 +539,140 @@ class reports(commands.Cog, name='reports'):
         else:
             await ctx.send('Username not in database.')
 
+    @report.group(invoke_without_command=True)
+    @is_staff()
+    async def list(self, ctx, page: int = None):
+        total = await self.bot.pool.fetchval('SELECT count(*) FROM staff_reports;')
+        pages = max(1, -(-total // REPORTS_PER_PAGE))
+
+        if page is None or page >= pages:
+            # Pages are counted from the first report, so the latest one only holds what's left over
+            page = pages
+            rows = await self.fetch_page(limit=total - (pages - 1) * REPORTS_PER_PAGE)
+        else:
+            page = max(1, page)
+            # Jumping straight to a page is the only place that needs an offset, and only over the primary key
+            first = await self.bot.pool.fetchval(
+                'SELECT id FROM staff_reports ORDER BY id ASC OFFSET $1 LIMIT 1;', (page - 1) * REPORTS_PER_PAGE
+            )
+            rows = await self.fetch_page(after=first - 1)
+
+        if not rows:
+            return await ctx.send('There are no reports yet.')
+
+        message = await ctx.send(self.format_page(rows, page, pages))
+
+        # Paging runs on its own, so the command (and its limiter slot) finishes once the first page is up
+        self.bot.loop.create_task(self.paginate(ctx, message, rows, page, pages))
+
+    async def paginate(self, ctx, message, rows, page, pages):
+        # Errors here can't reach the command error handler anymore
+        try:
+            await self.turn_pages(ctx, message, rows, page, pages)
+        except Exception:
+            log.exception(f'Paging through reports for {ctx.author.id} failed.')
+
+    async def turn_pages(self, ctx, message, rows, page, pages):
+        await add_reactions(message, (PREVIOUS_PAGE, NEXT_PAGE))
+
+        def check(reaction, user):
+            return (
+                user.id == ctx.author.id
+                and reaction.message.id == message.id
+                and str(reaction) in (PREVIOUS_PAGE, NEXT_PAGE)
+            )
+
+        while True:
+            try:
+                reaction, user = await self.bot.wait_for('reaction_add', check=check, timeout=120)
+            except asyncio.TimeoutError:
+                break
+
+            try:
+                await message.remove_reaction(reaction, user)
+            except discord.Forbidden:
+                pass
+
+            if str(reaction) == PREVIOUS_PAGE:
+                new_rows = await self.fetch_page(before=rows[0]['id'])
+                new_page = page - 1
+            else:
+                new_rows = await self.fetch_page(after=rows[-1]['id'])
+                new_page = page + 1
+
+            if not new_rows:
+                continue
+
+            rows, page = new_rows, new_page
+            await message.edit(content=self.format_page(rows, page, max(pages, page)))
+
+        try:
+            await message.clear_reactions()
+        except discord.Forbidden:
+            pass
+
+    @list.command(name='rollbacks')
+    @is_staff()
+    async def list_rollbacks(self, ctx, scope=None):
+        if scope and scope.lower() == 'public':
+            # Rollbacks by staff not linked to Discord carry their Terraria name instead of an id
+            rollbacks = await self.bot.pool.fetch(
+                '''
+                SELECT id, username, blocks, staff, happened_at
+                    FROM rollbacks
+                    WHERE NOT filled AND staff !~ '^[0-9]+$'
+                    ORDER BY id DESC
+                    LIMIT 25;
+                '''
+            )
+        else:
+            rollbacks = await self.bot.pool.fetch(
+                '''
+                SELECT id, username, blocks, staff, happened_at
+                    FROM rollbacks
+                    WHERE NOT filled AND staff = $1
+                    ORDER BY id DESC
+                    LIMIT 25;
+                ''',
+                str(ctx.author.id),
+            )
+
+        if not rollbacks:
+            return await ctx.send('There are no rollbacks left to report.')
+
+        table = tabulate.tabulate(
+            [
+                [
+                    rollback['id'],
+                    rollback['username'][:20] if rollback['username'] else '',
+                    rollback['blocks'],
+                    rollback['staff'][:20] if rollback['staff'] else '',
+                    rollback['happened_at'].strftime('%d %b %H:%M') if rollback['happened_at'] else '',
+                ]
+                for rollback in rollbacks
+            ],
+            headers=['id', 'username', 'blocks', 'staff', 'happened_at'],
+        )
+        await ctx.send(f'```\n{table}```Use {ctx.prefix}report create (rollback id) to report one.')
+
     @report.command()
     @is_staff()
-    async def id(self, ctx, id: int):
-        report = await self.bot.pool.fetchrow(
-            """
-        SELECT *
-            FROM staff_reports
-            WHERE id = $1;
-        """,
-            id,
+    async def search(self, ctx, *, query):
+        results = await self.user_search.search(query)
+
+        if not results:
+            return await ctx.send('No similar users found.')
+
+        table = tabulate.tabulate(
+            [[row['username'], row['reports'], f'{row["rank"]:.2f}'] for row in results],
+            headers=['username', 'reports', 'match'],
         )
+        await ctx.send(f'```\n{table}```')
+
+    @report.command()
+    @is_staff()
+    async def id(self, ctx, id: int):
+        report = await self.bot.pool.fetchrow(queries.REPORT_BY_ID, id)
 
         if not report:
             raise NoReportFound('No report by that ID was found.')
@@ -276,37 +711,33 @@ class reports(commands.Cog, name='reports'):
         if post:
             await ctx.send(post)
 
-    @report.command()
-    @is_staff()
-    async def edit(self, ctx, id: int):
-        report = await self.bot.pool.fetchrow(
-            """
-        SELECT *
-            FROM staff_reports
-            WHERE id = $1
-        """,
-            id,
-        )
+    async def fill_edit(self, ctx, draft):
+        id = draft['id']
+
+        report = await self.bot.pool.fetchrow(queries.REPORT_BY_ID, id)
 
         if not report:
+            self.drafts.discard(ctx.author.id)
             raise (NoReportFound('No Report by that ID was found.'))
 
-        field = await ctx.get_field()
+        field = await self.ask(ctx, draft, 'field', ctx.get_field)
 
         if field == 'username':
-            field_info = await ctx.get_username()
+            field_info = await self.ask(ctx, draft, 'value', ctx.get_username)
         elif field == 'type':
-            field_info = await ctx.get_type()
+            field_info = await self.ask(ctx, draft, 'value', ctx.get_type)
         elif field == 'image_links':
-            field_info = await ctx.edit_image_links(image_links=report['image_links'])
+            field_info = await self.ask(
+                ctx, draft, 'value', ctx.edit_image_links, image_links=report['image_links'], report_id=id
+            )
         elif field == 'blocks':
-            field_info = await ctx.get_blocks()
+            field_info = await self.ask(ctx, draft, 'value', ctx.get_blocks_affected)
         elif field == 'summary':
-            field_info = await ctx.get_summary()
+            field_info = await self.ask(ctx, draft, 'value', ctx.get_summary)
         elif field == 'happened_at':
-            field_info = await ctx.get_time(report['type'])
+            field_info = await self.ask(ctx, draft, 'value', ctx.get_time, type=report['type'])
         elif field == 'punishment':
-            field_info = await ctx.get_punishment()
+            field_info = await self.ask(ctx, draft, 'value', ctx.get_punishment)
 
         await self.bot.pool.execute(
             f"""
@@ -318,8 +749,69 @@ class reports(commands.Cog, name='reports'):
             id,
         )
 
+        self.drafts.discard(ctx.author.id)
+        self.invalidate_profile(report['username'])
+        if field == 'username':
+            self.invalidate_profile(field_info)
+
         await ctx.send(f'Report edited! Use r!report id {id} to check out the edited report.')
 
+    @report.command()
+    @is_staff()
+    async def edit(self, ctx, id: int):
+        await self.fill_edit(ctx, {'command': 'edit', 'id': id})
+
+    @report.command()
+    @is_staff()
+    async def resume(self, ctx):
+        draft = await self.drafts.load(ctx.author.id)
+
+        if not draft:
+            return await ctx.send('You have no unfinished reports.')
+
+        if draft['command'] == 'edit':
+            await ctx.send(f'Resuming your edit of report {draft["id"]}.')
+            await self.fill_edit(ctx, draft)
+        else:
+            await ctx.send(f'Resuming your report on {draft.get("username", "a new user")}.')
+            await self.fill_new(ctx, draft)
+
+    @report.command()
+    @is_staff()
+    async def export(self, ctx, format='csv', *filters):
+        format = format.lower()
+        if format not in FORMATS:
+            # Let the format be left out when filtering
+            filters = (format, *filters)
+            format = 'csv'
+
+        try:
+            query, args = build_query(filters)
+        except ValueError as e:
+            raise InvalidInput(str(e))
+
+        with tempfile.TemporaryFile() as f:
+            async with ctx.typing():
+                async with self.bot.pool.acquire() as connection:
+                    count = await export_reports(connection, f, format, query, args)
+
+            limit = ctx.guild.filesize_limit if ctx.guild else 8 * 1024 * 1024
+            if f.tell() > limit:
+                return await ctx.send(f'The export of {count} reports is too large to upload. Narrow the filters.')
+
+            f.seek(0)
+            filename = f'reports-{datetime.date.today().isoformat()}.{format}.gz'
+            await ctx.send(f'Exported {count} reports.', file=discord.File(f, filename=filename))
+
+    def cog_unload(self):
+        self.bot.loop.create_task(self.rollback_writer.flush())
+        self.bot.loop.create_task(self.drafts.flush())
+
+    async def cog_command_error(self, ctx, error):
+        # A cancelled wizard is thrown away, anything else (like a timeout) can still be resumed
+        if isinstance(error, UserCancellation) and ctx.command.name in ('new', 'edit', 'resume'):
+            self.drafts.discard(ctx.author.id)
+
 
 def setup(bot):
     bot.add_cog(reports(bot))
@@ -1,49 +1,215 @@
+import asyncio
+import logging
+from collections import defaultdict
+
 from discord.ext import commands
 
+from isla import metrics, queries
+from isla.isla import is_staff
+
+
+log = logging.getLogger(__name__)
+
+
+class RoleCoalescer:
+    """Merge bursts of role changes for a member into a single member edit."""
+
+    def __init__(self, loop, delay=2.0):
+        self.loop = loop
+        self.delay = delay
+
+        # member_id -> (member, {role_id: (role, add)})
+        self.pending = {}
+        self.requested = 0
+        self.calls = 0
+
+    @property
+    def saved(self):
+        return self.requested - self.calls
+
+    def add(self, member, roles):
+        self.queue(member, roles, True)
+
+    def remove(self, member, roles):
+        self.queue(member, roles, False)
+
+    def queue(self, member, roles, add):
+        self.requested += 1
+
+        if member.id not in self.pending:
+            self.pending[member.id] = (member, {})
+            self.loop.create_task(self.flush_later(member.id))
+
+        # Only the latest change to a role is kept, so add/remove flapping collapses
+        changes = self.pending[member.id][1]
+        for role in roles:
+            changes[role.id] = (role, add)
+
+    async def flush_later(self, member_id):
+        await asyncio.sleep(self.delay)
+        await self.flush(member_id)
+
+    async def flush(self, member_id):
+        member, changes = self.pending.pop(member_id)
+
+        # The member cache may have a newer copy by now
+        member = member.guild.get_member(member_id) or member
+
+        current = {role.id: role for role in member.roles if not role.is_default()}
+        new = dict(current)
+        for role_id, (role, add) in changes.items():
+            if add:
+                new[role_id] = role
+            else:
+                new.pop(role_id, None)
+
+        if new.keys() == current.keys():
+            return
+
+        self.calls += 1
+        try:
+            await member.edit(roles=list(new.values()), reason='Reaction roles')
+        except Exception:
+            log.exception(f'Unable to update reaction roles for member {member_id}.')
+
 
 class roles(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
+        # (message_id, emoji_id) -> [role_id, ...]
+        self.index = {}
+        self.index_loaded = False
+        self.listener_connection = None
+        self.coalescer = RoleCoalescer(bot.loop)
+
+        self.listen_task = self.bot.loop.create_task(self.start_index())
+
+    def cog_unload(self):
+        self.listen_task.cancel()
+
+        if self.listener_connection is not None:
+            self.listener_connection.remove_termination_listener(self.on_listener_terminated)
+            self.bot.loop.create_task(self.bot.pool.release(self.listener_connection))
+
+    async def start_index(self):
+        await self.bot.wait_until_ready()
+        await self.listen()
+
+    async def listen(self, delay=1):
+        """Listen for changes and load the index, retrying with backoff until both work."""
+
+        while True:
+            try:
+                # The terraria_one_roles trigger sends a notification on every change,
+                # so edits made straight in the database are picked up without a command.
+                if self.listener_connection is None:
+                    self.listener_connection = await self.acquire_listener()
+
+                await self.load_index()
+                return
+            except Exception:
+                log.exception(f'Unable to load reaction roles, retrying in {delay} seconds.')
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 300)
+
+    async def acquire_listener(self):
+        connection = await self.bot.pool.acquire()
+        try:
+            await connection.add_listener('terraria_one_roles', self.on_roles_notify)
+            connection.add_termination_listener(self.on_listener_terminated)
+        except Exception:
+            await self.bot.pool.release(connection)
+            raise
+        return connection
+
+    def on_listener_terminated(self, connection):
+        # Changes made while reconnecting would be missed, so the index is reloaded as well
+        log.warning('Lost the terraria_one_roles listener connection, reconnecting.')
+
+        old, self.listener_connection = self.listener_connection, None
+        if old is not None:
+            self.bot.loop.create_task(self.bot.pool.release(old))
+
+        self.listen_task = self.bot.loop.create_task(self.listen())
+
+    async def load_index(self):
+        records = await self.bot.pool.fetch(queries.REACTION_ROLES)
+
+        index = defaultdict(list)
+        for record in records:
+            index[(record['message_id'], record['emoji_id'])].append(record['role_id'])
+
+        self.index = dict(index)
+        self.index_loaded = True
+
+        return len(records)
+
+    def on_roles_notify(self, connection, pid, channel, payload):
+        self.bot.loop.create_task(self.load_index())
+
+    async def get_roles(self, payload):
+        if not payload.guild_id:
+            return None
+
+        # Until the index has loaded every reaction is a miss, rather than piling up waiters
+        if not self.index_loaded:
+            return None
+
+        role_ids = self.index.get((payload.message_id, payload.emoji.id))
+        if not role_ids:
+            return None
+
+        guild = self.bot.get_guild(payload.guild_id)
+        member = guild.get_member(payload.user_id)
+        if member is None:
+            return None
+
+        react_roles = [role for role in map(guild.get_role, role_ids) if role is not None]
+        if not react_roles:
+            return None
+
+        return member, react_roles
+
+    @commands.group(name='roles')
+    @is_staff()
+    async def roles_group(self, ctx):
+        if ctx.invoked_subcommand:
+            return
+        await ctx.send(f'{sum(map(len, self.index.values()))} reaction roles on {len(self.index)} emojis.')
+
+    @roles_group.command()
+    @is_staff()
+    async def stats(self, ctx):
+        coalescer = self.coalescer
+        await ctx.send(
+            f'{coalescer.requested} role changes requested, {coalescer.calls} API calls made, '
+            f'{coalescer.saved} saved. {len(coalescer.pending)} members pending.'
+        )
+
+    @roles_group.command()
+    @is_staff()
+    async def reload(self, ctx):
+        count = await self.load_index()
+        await ctx.send(f'Reloaded {count} reaction roles.')
+
     @commands.Cog.listener(name="on_raw_reaction_add")
     async def on_raw_reaction_add(self, payload):
-        react_roles = await self.bot.pool.fetch(
-            '''
-            SELECT *
-                FROM terraria_one_roles;
-            '''
-        )
+        found = await self.get_roles(payload)
+        metrics.reaction_roles.inc('add', 'hit' if found else 'miss')
 
-        if payload.guild_id:
-            guild = self.bot.get_guild(payload.guild_id)
-            member = guild.get_member(payload.user_id)
-            for record in filter(
-                lambda record: record["message_id"] == payload.message_id and payload.emoji.id == record["emoji_id"],
-                react_roles,
-            ):
-                await member.add_roles(guild.get_role(record["role_id"]))
-            else:
-                return None
+        if found:
+            member, react_roles = found
+            self.coalescer.add(member, react_roles)
 
     @commands.Cog.listener(name="on_raw_reaction_remove")
     async def on_raw_reaction_remove(self, payload):
-        react_roles = await self.bot.pool.fetch(
-            '''
-            SELECT *
-                FROM terraria_one_roles;
-            '''
-        )
+        found = await self.get_roles(payload)
+        metrics.reaction_roles.inc('remove', 'hit' if found else 'miss')
 
-        if payload.guild_id:
-            guild = self.bot.get_guild(payload.guild_id)
-            member = guild.get_member(payload.user_id)
-            for record in filter(
-                lambda record: record["message_id"] == payload.message_id and payload.emoji.id == record["emoji_id"],
-                react_roles,
-            ):
-                await member.remove_roles(guild.get_role(record["role_id"]))
-            else:
-                return None
+        if found:
+            member, react_roles = found
+            self.coalescer.remove(member, react_roles)
 
 
 def setup(bot):
@@ -0,0 +1,161 @@
+"""
+Isla Bot: Reporting functionality for a Terraria Server
+Copyright (C) 2020 Rina
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import re
+
+
+NUMBER = (int, float)
+
+# section -> (required, {key: (types, required)}), or None for keys that are passed through untouched
+SCHEMA = {
+    'bot': (
+        True,
+        {
+            'owner_id': (int, True),
+            'token': (str, True),
+            'prefix': ((str, list), True),
+            'channels': (list, False),
+            'wizard_timeout': (NUMBER, False),
+            'extensions': (list, False),
+        },
+    ),
+    'server': (
+        True,
+        {
+            'guild_id': (int, True),
+            'staff_role_id': (int, True),
+            'communication_channel_id': (int, True),
+            'rollback_pattern': (str, False),
+        },
+    ),
+    'limits': (
+        False,
+        {
+            'max_concurrency': (int, False),
+            'policy': (str, False),
+            'max_queue': (int, False),
+            'queue_timeout': (NUMBER, False),
+            'cooldowns': (dict, False),
+        },
+    ),
+    'archive': (False, {'path': (str, False), 'workers': (int, False), 'queue_size': (int, False)}),
+    'metrics': (False, {'host': (str, False), 'port': (int, False)}),
+    'pool': (
+        False,
+        {
+            'min_size': (int, False),
+            'max_size': (int, False),
+            'statement_cache_size': (int, False),
+            'max_inactive_connection_lifetime': (NUMBER, False),
+            'max_queries': (int, False),
+            'command_timeout': (NUMBER, False),
+            'slow_query_threshold': (NUMBER, False),
+        },
+    ),
+    'postgres': (True, None),
+}
+
+
+class ConfigError(Exception):
+    pass
+
+
+def type_names(types):
+    types = types if isinstance(types, tuple) else (types,)
+    return ' or '.join(type.__name__ for type in types)
+
+
+def validate_config(config):
+    """
+    Check the layout of config.yaml, raising ConfigError listing every problem found.
+
+    Optional sections and keys left empty are removed, so the defaults apply instead of None.
+    """
+
+    if not isinstance(config, dict):
+        raise ConfigError('config.yaml is empty or is not a mapping.')
+
+    problems = [f'Unknown section "{section}".' for section in config if section not in SCHEMA]
+
+    for section, (required, keys) in SCHEMA.items():
+        values = config.get(section)
+        if values is None:
+            if required:
+                problems.append(f'Missing section "{section}".')
+            config.pop(section, None)
+            continue
+
+        if not isinstance(values, dict):
+            problems.append(f'"{section}" should be a mapping.')
+            continue
+
+        if keys is None:
+            continue
+
+        problems.extend(f'Unknown key "{section}.{key}".' for key in values if key not in keys)
+
+        for key, (types, key_required) in keys.items():
+            value = values.get(key)
+            if value is None:
+                if key_required:
+                    problems.append(f'Missing key "{section}.{key}".')
+                values.pop(key, None)
+            elif not isinstance(value, types) or isinstance(value, bool):
+                problems.append(f'"{section}.{key}" should be {type_names(types)}, not {type(value).__name__}.')
+
+    problems.extend(check_values(config))
+
+    if problems:
+        raise ConfigError('Invalid config.yaml:\n' + '\n'.join(f'- {problem}' for problem in problems))
+
+    return config
+
+
+def check_values(config):
+    """Problems with values that have the right type but can't be used."""
+
+    def get(section, key):
+        values = config.get(section)
+        return values.get(key) if isinstance(values, dict) else None
+
+    pattern = get('server', 'rollback_pattern')
+    if isinstance(pattern, str):
+        try:
+            re.compile(pattern)
+        except re.error as e:
+            yield f'"server.rollback_pattern" is not a valid regex: {e}.'
+
+    for key, types in (('channels', int), ('extensions', str)):
+        items = get('bot', key)
+        if isinstance(items, list) and not all(isinstance(item, types) for item in items):
+            yield f'"bot.{key}" should be a list of {type_names(types)}.'
+
+    policy = get('limits', 'policy')
+    if isinstance(policy, str) and policy not in ('reject', 'queue'):
+        yield f'"limits.policy" should be reject or queue, not {policy}.'
+
+    cooldowns = get('limits', 'cooldowns')
+    for name, cooldown in (cooldowns.items() if isinstance(cooldowns, dict) else ()):
+        if not (
+            isinstance(cooldown, list)
+            and len(cooldown) == 2
+            and isinstance(cooldown[0], int)
+            and isinstance(cooldown[1], NUMBER)
+            and not any(isinstance(value, bool) for value in cooldown)
+        ):
+            yield f'"limits.cooldowns.{name}" should be [uses, seconds].'
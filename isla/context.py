@@ -17,11 +17,19 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 import asyncio
 import datetime
+import logging
+import re
+import shlex
 
+import discord
 from discord.ext import commands
 
-from common import time_date, time_dh, url_grabber
-from isla.errors import NoImageLinks, UserCancellation
+from common import extract_links, time_date, time_dh, url_grabber
+from isla import metrics
+from isla.errors import NoImageLinks
+
+
+log = logging.getLogger(__name__)
 
 
 types = {'grief': 'griefer', 'chat': 'chat abuser', 'hack': 'hacker', 'other': 'abuser', 'tunnel': 'tunneler'}
@@ -29,6 +37,114 @@ types = {'grief': 'griefer', 'chat': 'chat abuser', 'hack': 'hacker', 'other': '
 punishments = ['tban', 'pban', 'mute', 'pmute', 'kick', 'warn', 'null']
 
 
+def parse_time_dh(text):
+    """Turn XXdXXh (how long ago) into the date it happened, or None."""
+
+    search = time_dh.findall(text)
+    if search:
+        time_list = [int(item) for item in search[0]]
+        return (datetime.datetime.now() - datetime.timedelta(days=time_list[0], hours=time_list[1])).date()
+
+
+def parse_time_date(text):
+    """Turn DD/MM into a date this year, or None."""
+
+    search = time_date.findall(text)
+    if search:
+        time_list = [int(i) for i in search[0]]
+        try:
+            return datetime.date(day=time_list[0], month=time_list[1], year=datetime.datetime.now().year)
+        except ValueError:
+            return None
+
+
+quoted_summary = re.compile(r'"([^"]*)"\s*$')
+
+
+def parse_quick_report(line, image_links=()):
+    """
+    Parse a whole report from one line: username type time [blocks] [punishment] ["summary"]
+
+    Usernames with spaces can be quoted. Time is XXdXXh or DD/MM, and links anywhere
+    in the line are added to image_links. Every problem is collected, so that one
+    ValueError lists all of them.
+    """
+
+    summary = None
+    search = quoted_summary.search(line)
+    if search:
+        summary = search.group(1) or None
+        line = line[: search.start()]
+
+    links = url_grabber.findall(line)
+    line = url_grabber.sub(' ', line)
+
+    # Only double quotes group words, since usernames often have apostrophes in them
+    lexer = shlex.shlex(line, posix=True)
+    lexer.quotes = '"'
+    lexer.whitespace_split = True
+    lexer.commenters = ''
+
+    try:
+        tokens = list(lexer)
+    except ValueError as e:
+        raise ValueError(f'Could not read the report: {e}.') from None
+
+    problems = []
+    report = {
+        'username': None,
+        'type': None,
+        'happened_at': None,
+        'blocks': None,
+        'punishment': None,
+        'summary': summary,
+        'image_links': list(dict.fromkeys([*image_links, *links])),
+    }
+
+    if len(tokens) < 2:
+        raise ValueError('A quick report needs at least a username, a type and a time.')
+
+    report['username'], type, *rest = tokens
+
+    if type.lower() in types:
+        report['type'] = type.lower()
+    else:
+        problems.append(f'"{type}" is not a type. Types: {", ".join(types)}.')
+
+    time_given = False
+
+    for token in rest:
+        lowered = token.lower()
+        if time_dh.fullmatch(lowered) and not time_given:
+            report['happened_at'] = parse_time_dh(lowered)
+            time_given = True
+        elif time_date.fullmatch(lowered) and not time_given:
+            report['happened_at'] = parse_time_date(lowered)
+            time_given = True
+            if report['happened_at'] is None:
+                problems.append(f'"{token}" is not a real date.')
+        elif token.isdigit() and report['blocks'] is None:
+            report['blocks'] = int(token)
+        elif lowered in punishments and report['punishment'] is None:
+            report['punishment'] = lowered
+        else:
+            problems.append(f'Not sure what "{token}" is. Put summaries in "quotes".')
+
+    if not time_given:
+        problems.append('A time is required, as XXdXXh (how long ago) or DD/MM.')
+
+    if report['blocks'] is None:
+        if report['type'] == 'hack':
+            report['blocks'] = 0
+        elif report['type'] is not None:
+            problems.append('A block count is required for this type.')
+
+    if problems:
+        raise ValueError('\n'.join(problems))
+
+    return report
+
+
 def default_check(message):
     return True
 
@@ -37,49 +153,51 @@ def default_return_operation(message):
     return message.content
 
 
-def check_reaction(ctx, my_message, skippable):
-    def check_reaction(reaction, user):
-        if user.id == ctx.author.id and reaction.message.id == my_message.id:
-            if str(reaction) == '❌':
-                raise UserCancellation('User cancelled command.')
-            return skippable and str(reaction) == '✅'
-        return False
+def is_skip(response):
+    """Whether a prompt was answered by pressing ✅ instead of sending a message."""
+    return isinstance(response, discord.Reaction)
 
-    return check_reaction
 
+async def add_reactions(message, emojis):
+    try:
+        for emoji in emojis:
+            await message.add_reaction(emoji)
+    except discord.HTTPException:
+        pass
 
-def message_check(ctx):
-    def message_check(message):
-        return message.author.id == ctx.author.id and message.channel == ctx.message.channel
 
-    return message_check
+class Prompt:
+    """
+    A question sent to the user.
 
+    The reactions are added in the background, so the user can answer (and is listened to)
+    as soon as the message is sent. Reactions that haven't been added by the time the
+    prompt is answered are skipped, which saves requests when the user types quickly.
+    """
 
-async def wait_for_message_or_reaction(ctx, my_message, skippable):
-    done, pending = await asyncio.wait(
-        [
-            ctx.bot.wait_for('message', check=message_check(ctx)),
-            ctx.bot.wait_for('reaction_add', check=check_reaction(ctx, my_message, skippable)),
-        ],
-        return_when=asyncio.FIRST_COMPLETED,
-    )
+    def __init__(self, message, skippable):
+        self.message = message
+        emojis = ['✅', '❌'] if skippable else ['❌']
+        self.task = asyncio.ensure_future(add_reactions(message, emojis))
 
-    if done:
-        stuff = done.pop().result()
+    def close(self):
+        if not self.task.done():
+            self.task.cancel()
 
-        for future in pending:
-            future.cancel()
 
-            if stuff.__class__.__name__ == 'Message':
-                if stuff.content.lower() == 'stop':
-                    raise UserCancellation('User cancelled command.')
-            else:
-                stuff = stuff[0]
+class Context(commands.Context):
+    session = None
 
-    return stuff
+    def get_session(self):
+        if self.session is None:
+            self.session = self.bot.sessions.open(self.channel.id, self.author.id, ignore=self.message)
+        return self.session
 
+    def close_session(self):
+        if self.session is not None:
+            self.session.close()
+            self.session = None
 
-class Context(commands.Context):
     async def send_all(self, text):
         currently_in_codeblock = 0
 
@@ -101,29 +219,35 @@ class Context(commands.Context):
         await self.send(current_post)
 
     async def _get_field_info(
-        self, msg_1=None, msg_2=None, check=default_check, return_operation=default_return_operation, skippable=False
+        self,
+        step=None,
+        msg_1=None,
+        msg_2=None,
+        check=default_check,
+        return_operation=default_return_operation,
+        skippable=False,
     ):
-        my_message = await self.send(msg_1)
-        if skippable:
-            await my_message.add_reaction('✅')
-        await my_message.add_reaction('❌')
-
-        response = await wait_for_message_or_reaction(self, my_message, skippable)
+        session = self.get_session()
 
-        while not check(response):
-            my_message = await self.send(msg_2)
-            if skippable:
-                await my_message.add_reaction('✅')
-            await my_message.add_reaction('❌')
+        with metrics.wizard_steps.time(step):
+            response = await self.prompt(session, msg_1, skippable)
 
-            response = await wait_for_message_or_reaction(self, my_message, skippable)
+            while not check(response):
+                response = await self.prompt(session, msg_2, skippable)
 
         return return_operation(response)
 
+    async def prompt(self, session, text, skippable):
+        prompt = Prompt(await self.send(text), skippable)
+        try:
+            return await session.wait(prompt.message, skippable)
+        finally:
+            prompt.close()
+
     # Staff Reports
 
     async def get_username(self):
-        return await self._get_field_info(msg_1='Please send the username of the rulebreaker')
+        return await self._get_field_info(step='username', msg_1='Please send the username of the rulebreaker')
 
     async def get_type(self):
         def check(message):
@@ -133,6 +257,7 @@ class Context(commands.Context):
             return message.content.lower()
 
         return await self._get_field_info(
+            step='type',
             msg_1=f'What type of offense happened? Types: grief, chat, hack, other, or tunnel.',
             msg_2='Incorrect input! Try again.',
             check=check,
@@ -141,11 +266,12 @@ class Context(commands.Context):
 
     async def get_summary(self):
         def return_operation(message):
-            if str(message) == '✅':
+            if is_skip(message):
                 return None
             return message.content
 
         return await self._get_field_info(
+            step='summary',
             msg_1=f'Type a summary. If you have no summary to add, press the ✅ to skip it.',
             return_operation=return_operation,
             skippable=True,
@@ -153,13 +279,17 @@ class Context(commands.Context):
 
     async def get_punishment(self):
         def check(message):
-            return message.content.lower() in punishments
+            return is_skip(message) or message.content.lower() in punishments
 
         def return_operation(message):
+            if is_skip(message):
+                return None
             return message.content.lower()
 
         return await self._get_field_info(
-            msg_1=f'What kind of punishment did the user get? Possible punishments are: tban, pban, mute, pmute, kick, or warn.',
+            step='punishment',
+            msg_1=f'What kind of punishment did the user get? Possible punishments are: tban, pban, mute, pmute, kick, '
+            f'or warn. Press the ✅ to skip it for now.',
             check=check,
             return_operation=return_operation,
             skippable=True,
@@ -177,31 +307,42 @@ class Context(commands.Context):
             return int(message.content)
 
         return await self._get_field_info(
+            step='blocks_affected',
             msg_1=f'Send how many blocks were affected.',
             msg_2=f'Incorrect input! Try sending a number this time.',
             return_operation=return_operation,
             check=check,
         )
 
-    async def get_image_links(self, image_links=[]):
-        self.image_links = image_links
+    async def get_image_links(self, image_links=None, report_id=None, on_change=None):
+        self.image_links = list(image_links or [])
+        existing = len(self.image_links)
+        seen = set(self.image_links)
 
         def check(message):
             if message.__class__.__name__ == 'Message':
-                new_links = url_grabber.findall(message.content) + [
-                    attachment.url for attachment in message.attachments
-                ]
+                links = extract_links(message.content, message.attachments)
             else:
-                new_links = []
+                links = []
 
+            new_links = [link for link in links if link not in seen]
+            seen.update(new_links)
             self.image_links += new_links
 
-            return not new_links
+            if new_links and on_change is not None:
+                on_change(list(self.image_links))
+
+            return not links
 
         def return_operation(message):
+            # Start copying the new proof while the CDN links are fresh, and check it hasn't been used before
+            new_links = self.image_links[existing:]
+            if self.bot.proof_index and new_links:
+                self.bot.loop.create_task(self.warn_duplicate_proof(new_links, report_id))
             return self.image_links
 
         return await self._get_field_info(
+            step='image_links',
             msg_1=f'Send proof images/links to images. (Can be in multiple messages).',
             msg_2=f'Press the ✅ to end, or continue sending proof.',
             return_operation=return_operation,
@@ -209,6 +350,17 @@ class Context(commands.Context):
             skippable=True,
         )
 
+    async def warn_duplicate_proof(self, image_links, report_id=None):
+        try:
+            duplicates = await self.bot.proof_index.find_duplicates(image_links, exclude=report_id)
+        except Exception:
+            log.exception('Unable to check proof for duplicates.')
+            return
+
+        for link, report_ids in duplicates.items():
+            reports = ', '.join(f'#{id}' for id in report_ids)
+            await self.send(f'⚠ This proof looks like proof already used on report {reports}: <{link}>')
+
     async def remove_image_links(self, image_links=[]):
         if not image_links:
             raise NoImageLinks()
@@ -225,6 +377,7 @@ class Context(commands.Context):
         images_by_number = '\n'.join(f'`{i}`: {j}' for i, j in enumerate(image_links))
 
         return await self._get_field_info(
+            step='remove_image_links',
             msg_1=f'Send the number corresponding with the image you want removed\n{images_by_number}',
             msg_2='Incorrect input! Try again.',
             check=check,
@@ -232,17 +385,18 @@ class Context(commands.Context):
             skippable=True,
         )
 
-    async def edit_image_links(self, image_links=[]):
+    async def edit_image_links(self, image_links=[], report_id=None):
         def check(message):
             return message.content.lower() in ['remove', 'add']
 
         def return_operation(message):
-            return {'remove': self.remove_image_links, 'add': self.get_image_links}[message.content.lower()](
-                image_links=image_links
-            )
+            if message.content.lower() == 'add':
+                return self.get_image_links(image_links=image_links, report_id=report_id)
+            return self.remove_image_links(image_links=image_links)
 
         return await (
             await self._get_field_info(
+                step='edit_image_links',
                 msg_1='Would you like to add or remove images? Proper responses include: `add`, `remove`',
                 msg_2='Incorrect input! Try again.',
                 return_operation=return_operation,
@@ -266,22 +420,24 @@ class Context(commands.Context):
             return message.content.lower().replace(' ', '_')
 
         return await self._get_field_info(
+            step='field',
             msg_1=f'Which field do you want to edit? Fields: `username`, `type`, `image links`, `blocks`, `summary`, `happened at`, `punishment`.',
             msg_2=f'Incorrect input! Try again.',
             return_operation=return_operation,
             check=check,
-            skippable=True,
         )
 
     async def get_time_dh(self):
         def check(message):
-            return time_dh.findall(message.content)
+            return is_skip(message) or time_dh.findall(message.content)
 
         def return_operation(message):
-            time_list = [int(item) for item in time_dh.findall(message.content)[0]]
-            return (datetime.datetime.now() - datetime.timedelta(days=time_list[0], hours=time_list[1])).date()
+            if is_skip(message):
+                return None
+            return parse_time_dh(message.content)
 
         return await self._get_field_info(
+            step='time_dh',
             msg_1=f'How long ago did this occur? Format: XXdXXh',
             msg_2=f'Incorrect input! Try again.',
             return_operation=return_operation,
@@ -290,20 +446,20 @@ class Context(commands.Context):
         )
 
     async def get_time_date(self):
-        def message_to_date(message):
-            search = time_date.findall(message.content)
-            if search:
-                time_list = [int(i) for i in search[0]]
-                try:
-                    return datetime.date(day=time_list[0], month=time_list[1], year=datetime.datetime.now().year)
-                except:
-                    return False
+        def check(message):
+            return is_skip(message) or parse_time_date(message.content)
+
+        def return_operation(message):
+            if is_skip(message):
+                return None
+            return parse_time_date(message.content)
 
         return await self._get_field_info(
+            step='time_date',
             msg_1=f'When did this occur? Format: DD/MM',
             msg_2=f'Incorrect input! Try again.',
-            return_operation=message_to_date,
-            check=message_to_date,
+            return_operation=return_operation,
+            check=check,
             skippable=True,
         )
 
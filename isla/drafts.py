@@ -0,0 +1,98 @@
+"""
+Isla Bot: Reporting functionality for a Terraria Server
+Copyright (C) 2020 Rina
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import datetime
+import json
+
+from .batching import BatchWriter
+
+
+def encode(value):
+    if isinstance(value, datetime.date):
+        return {'__date__': value.isoformat()}
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def decode(value):
+    if '__date__' in value:
+        return datetime.date.fromisoformat(value['__date__'])
+    return value
+
+
+class DraftStore(BatchWriter):
+    """
+    Checkpoint the answers of unfinished report wizards to report_drafts.
+
+    Saving only updates memory, the database is written in the background at most
+    once every delay seconds, so checkpointing adds nothing to the time a prompt takes.
+    """
+
+    description = 'report drafts'
+
+    def __init__(self, bot, delay=2.0, max_retries=8):
+        super().__init__(bot, delay, max_retries)
+
+        # staff -> encoded draft, or None when the draft should be deleted
+        self.pending = {}
+
+    def save(self, staff, draft):
+        self.queue(str(staff), json.dumps(draft, default=encode))
+
+    def discard(self, staff):
+        self.queue(str(staff), None)
+
+    def queue(self, staff, data):
+        self.pending[staff] = data
+        self.schedule()
+
+    async def load(self, staff):
+        staff = str(staff)
+
+        if staff in self.pending:
+            data = self.pending[staff]
+        else:
+            data = await self.bot.pool.fetchval('SELECT data FROM report_drafts WHERE staff = $1;', staff)
+
+        return json.loads(data, object_hook=decode) if data else None
+
+    def take(self):
+        pending, self.pending = self.pending, {}
+        return pending
+
+    def restore(self, batch):
+        # Anything saved since the batch was taken is newer, so it wins
+        self.pending = {**batch, **self.pending}
+
+    async def write(self, batch):
+        saved = [(staff, data) for staff, data in batch.items() if data is not None]
+        deleted = [staff for staff, data in batch.items() if data is None]
+
+        async with self.bot.pool.acquire() as connection:
+            async with connection.transaction():
+                if saved:
+                    await connection.executemany(
+                        '''
+                        INSERT INTO report_drafts (staff, data)
+                            VALUES ($1, $2::jsonb)
+                            ON CONFLICT (staff)
+                            DO UPDATE SET data = excluded.data, updated_at = current_timestamp;
+                        ''',
+                        saved,
+                    )
+                if deleted:
+                    await connection.execute('DELETE FROM report_drafts WHERE staff = any($1);', deleted)
@@ -29,3 +29,19 @@ class NoReportFound(commands.CommandError):
 
 class NoImageLinks(commands.CommandError):
     pass
+
+
+class NoRollbackFound(commands.CommandError):
+    pass
+
+
+class RollbackAlreadyFilled(commands.CommandError):
+    pass
+
+
+class SessionTimeout(commands.CommandError):
+    pass
+
+
+class InvalidInput(commands.CommandError):
+    pass
@@ -0,0 +1,128 @@
+"""
+Isla Bot: Reporting functionality for a Terraria Server
+Copyright (C) 2020 Rina
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import csv
+import datetime
+import gzip
+import io
+import json
+
+
+FORMATS = ('csv', 'jsonl')
+
+COLUMNS = (
+    'id',
+    'username',
+    'type',
+    'punishment',
+    'image_links',
+    'blocks',
+    'staff',
+    'summary',
+    'happened_at',
+    'reported_at',
+    'rollbacks',
+)
+
+
+def parse_date(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'"{value}" is not a date. Use YYYY-MM-DD.') from None
+
+
+def parse_staff(value):
+    # Accept mentions as well as raw ids, staff is stored as the id string
+    return value.strip('<@!>')
+
+
+FILTERS = {
+    'user': ('lower(username) = lower(${})', str),
+    'type': ('type = ${}', str),
+    'from': ('happened_at >= ${}', parse_date),
+    'to': ('happened_at <= ${}', parse_date),
+    'staff': ('staff = ${}', parse_staff),
+}
+
+
+def build_query(filters):
+    """
+    Build the export query for a list of key=value filters.
+
+    Raises ValueError for unknown keys or malformed values.
+    """
+
+    conditions = []
+    args = []
+
+    for item in filters:
+        key, sep, value = item.partition('=')
+        key = key.lower()
+
+        if not sep or key not in FILTERS:
+            raise ValueError(f'"{item}" is not a filter. Filters: {", ".join(f"{key}=" for key in FILTERS)}.')
+
+        condition, converter = FILTERS[key]
+        args.append(converter(value))
+        conditions.append(condition.format(len(args)))
+
+    where = f'WHERE {" AND ".join(conditions)}' if conditions else ''
+    query = f'SELECT {", ".join(COLUMNS)} FROM staff_reports {where} ORDER BY id ASC;'
+
+    return query, args
+
+
+def format_value(value):
+    if isinstance(value, list):
+        return ' '.join(map(str, value))
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+async def export_reports(connection, fileobj, format, query, args):
+    """
+    Stream the rows of an export query into fileobj as gzip compressed csv or jsonl.
+
+    Rows are read through a server side cursor and written as they arrive,
+    so memory use doesn't depend on how many reports are exported.
+    Returns the number of rows written.
+    """
+
+    count = 0
+
+    with gzip.GzipFile(fileobj=fileobj, mode='wb') as compressed:
+        text = io.TextIOWrapper(compressed, encoding='utf-8', newline='')
+
+        if format == 'csv':
+            writer = csv.writer(text)
+            writer.writerow(COLUMNS)
+
+        async with connection.transaction():
+            async for record in connection.cursor(query, *args, prefetch=500):
+                if format == 'csv':
+                    writer.writerow([format_value(record[column]) for column in COLUMNS])
+                else:
+                    text.write(json.dumps(dict(record), default=format_value) + '\n')
+                count += 1
+
+        text.flush()
+        text.detach()
+
+    return count
@@ -0,0 +1,202 @@
+"""
+Isla Bot: Reporting functionality for a Terraria Server
+Copyright (C) 2020 Rina
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import asyncio
+import csv
+import datetime
+import logging
+import time
+
+import asyncpg
+
+from .isla import load_config
+from .migrations import migrate
+
+
+log = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+COLUMNS = (
+    'id',
+    'username',
+    'type',
+    'punishment',
+    'image_links',
+    'blocks',
+    'staff',
+    'summary',
+    'happened_at',
+    'reported_at',
+)
+
+
+def parse_array(text):
+    """Parse a one dimensional Postgres text array literal such as {a,"b c",NULL}."""
+
+    if not text:
+        return []
+
+    if not (text.startswith('{') and text.endswith('}')):
+        raise ValueError(f'Not an array literal: {text!r}')
+
+    items = []
+    item = []
+    quoted = False
+    was_quoted = False
+    escaped = False
+
+    for char in text[1:-1]:
+        if escaped:
+            item.append(char)
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char == '"':
+            quoted = not quoted
+            was_quoted = True
+        elif char == ',' and not quoted:
+            items.append(finish_item(item, was_quoted))
+            item, was_quoted = [], False
+        else:
+            item.append(char)
+
+    if item or was_quoted or items:
+        items.append(finish_item(item, was_quoted))
+
+    return items
+
+
+def finish_item(item, was_quoted):
+    item = ''.join(item)
+    if not was_quoted and item.upper() == 'NULL':
+        return None
+    return item
+
+
+def convert_row(row):
+    """Map a legacy reports.csv row onto the staff_reports columns."""
+
+    return (
+        int(row['report_id']),
+        row['user_name'],
+        row['type'],
+        row['punishment'] or None,
+        parse_array(row['img_links']),
+        int(row['blocks_broken']) if row['blocks_broken'] else None,
+        row['reporter_id'] or None,
+        row['summary'] or None,
+        datetime.date.fromisoformat(row['happened_at']) if row['happened_at'] else None,
+        datetime.datetime.fromisoformat(row['created_at']) if row['created_at'] else None,
+    )
+
+
+def read_batches(path, size=BATCH_SIZE):
+    with open(path, encoding='utf-8', newline='') as f:
+        batch = []
+        for row in csv.DictReader(f):
+            # Deleted reports were kept in the old bot with undeleted set to false
+            if row.get('undeleted', 't') != 't':
+                continue
+
+            batch.append(convert_row(row))
+            if len(batch) >= size:
+                yield batch
+                batch = []
+
+        if batch:
+            yield batch
+
+
+async def import_reports(connection, path, size=BATCH_SIZE):
+    """
+    Import a legacy reports.csv into staff_reports.
+
+    Rows are copied in batches into a temporary table and then merged on id,
+    so importing the same file twice doesn't duplicate anything.
+    Returns (rows read, rows inserted).
+    """
+
+    read = 0
+
+    async with connection.transaction():
+        await connection.execute(
+            '''
+            CREATE TEMPORARY TABLE staff_reports_import
+                (LIKE staff_reports INCLUDING DEFAULTS)
+                ON COMMIT DROP;
+            '''
+        )
+
+        for batch in read_batches(path, size):
+            await connection.copy_records_to_table('staff_reports_import', records=batch, columns=COLUMNS)
+            read += len(batch)
+
+        columns = ', '.join(COLUMNS)
+        inserted = await connection.fetchval(
+            f'''
+            WITH inserted AS (
+                INSERT INTO staff_reports ({columns})
+                    SELECT {columns} FROM staff_reports_import
+                    ON CONFLICT (id) DO NOTHING
+                    RETURNING 1
+            )
+            SELECT count(*) FROM inserted;
+            '''
+        )
+
+        # Imported rows carry their own ids, so new reports have to be numbered after them
+        await connection.execute(
+            '''
+            SELECT setval(pg_get_serial_sequence('staff_reports', 'id'), max(id))
+                FROM staff_reports
+                HAVING max(id) IS NOT NULL;
+            '''
+        )
+
+    return read, inserted
+
+
+async def main(args):
+    config = load_config(args.config)
+    pool = await asyncpg.create_pool(**config['postgres'])
+
+    try:
+        await migrate(pool)
+
+        async with pool.acquire() as connection:
+            start = time.perf_counter()
+            read, inserted = await import_reports(connection, args.file, args.batch_size)
+            elapsed = time.perf_counter() - start
+    finally:
+        await pool.close()
+
+    log.info(
+        f'Read {read} rows and inserted {inserted} new reports in {elapsed:.2f}s ({read / elapsed:.0f} rows/s).'
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Import a legacy reports.csv into staff_reports.')
+    parser.add_argument('file', nargs='?', default='reports.csv')
+    parser.add_argument('--config', default='config.yaml')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s] (%(levelname)s) %(name)s: %(message)s')
+    asyncio.run(main(parser.parse_args()))
@@ -15,15 +15,37 @@ GNU Affero General Public License for more details.
 You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
+import contextlib
 import logging
+import time
 
-import asyncpg
 import discord
 import ruamel.yaml
 from discord.ext import commands
 from discord.ext.commands import Bot
 
+from . import metrics
+from .archive import Archiver
+from .config import validate_config
 from .context import Context
+from .limiter import UserLimiter
+from .migrations import migrate, missing_tables
+from .phash import ProofIndex
+from .pool import Pool, current_context
+from .sessions import SessionRouter
+
+
+log = logging.getLogger(__name__)
+
+EXTENSIONS = ['isla.cogs.reports', 'isla.cogs.errors', 'isla.cogs.roles', 'isla.cogs.debug']
+
+# Loaded once the bot is connected so they don't hold up startup, unless bot.extensions says otherwise
+OPTIONAL_EXTENSIONS = ['jishaku']
+
+
+def load_config(path='config.yaml'):
+    with open(path, encoding='utf-8') as f:
+        return ruamel.yaml.YAML(typ='safe').load(f)
 
 
 def is_staff():
@@ -44,13 +66,24 @@ class Isla(Bot):
         )
 
         self.config = config
-        self.using = []
+        self.startup_timings = {}
+        self.limiter = UserLimiter.from_config(config.get('limits'))
         self.pool = None
+        self.metrics_runner = None
+        self.archiver = Archiver.from_config(self, config.get('archive'))
+        self.proof_index = ProofIndex(self, self.archiver) if self.archiver else None
+        self.sessions = SessionRouter(self, timeout=config['bot'].get('wizard_timeout', 600))
+
+        # Used by wants() to drop messages that can't be commands before any parsing happens
+        prefix = config['bot']['prefix']
+        self.prefixes = tuple(prefix) if isinstance(prefix, list) else (prefix,)
+        self.allowed_channels = frozenset(config['bot'].get('channels') or ())
 
-        extensions = ['jishaku', 'isla.cogs.reports', 'isla.cogs.errors', 'isla.cogs.roles']
+        self.optional_extensions = config['bot'].get('extensions', OPTIONAL_EXTENSIONS)
 
-        for cog in extensions:
-            self.load_extension(cog)
+        with self.startup_phase('extensions'):
+            for cog in EXTENSIONS:
+                self.load_extension(cog)
 
     def run(self):
         logger = logging.getLogger("discord")
@@ -60,35 +93,127 @@ class Isla(Bot):
             logging.Formatter("[%(asctime)s] (%(levelname)s) %(name)s: %(message)s", datefmt="%y %b %d %H:%M:%S",)
         )
         logger.addHandler(handler)
+        logging.getLogger("isla").setLevel(logging.INFO)
+        logging.getLogger("isla").addHandler(handler)
         return super().run(self.config['bot']['token'])
 
     @classmethod
     def with_config(cls):
-        with open('config.yaml', encoding='utf-8') as f:
-            data = ruamel.yaml.safe_load(f)
-        return cls(data)
+        start = time.perf_counter()
+        config = validate_config(load_config())
+        elapsed = time.perf_counter() - start
+
+        bot = cls(config)
+        bot.startup_timings = {'config': elapsed, **bot.startup_timings}
+        return bot
+
+    @contextlib.contextmanager
+    def startup_phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.startup_timings[name] = time.perf_counter() - start
 
     async def start(self, *args, **kwargs):
-        self.pool = await asyncpg.create_pool(**self.config['postgres'])
+        with self.startup_phase('pool'):
+            self.pool = await Pool.create(self.config['postgres'], self.config.get('pool'))
+            # Makes sure a connection is usable before anything else runs
+            await self.pool.fetchval('SELECT 1;')
+
+        with self.startup_phase('migrations'):
+            await migrate(self.pool)
+
+        with self.startup_phase('tables'):
+            missing = await missing_tables(self.pool)
+            if missing:
+                raise RuntimeError(f'Tables missing after migrating: {", ".join(missing)}.')
+
+        with self.startup_phase('services'):
+            if 'metrics' in self.config:
+                self.metrics_runner = await metrics.serve(**self.config['metrics'])
+
+            if self.archiver:
+                self.archiver.start()
+                self.proof_index.start()
+
+        self.loop.create_task(self.finish_startup())
         return await super().start(*args, **kwargs)
 
-    async def on_message(self, message):
-        ctx = await self.get_context(message, cls=Context)
+    async def close(self):
+        if self.archiver:
+            self.proof_index.close()
+            await self.archiver.close()
 
-        if ctx.author.bot:
+        if self.metrics_runner is not None:
+            await self.metrics_runner.cleanup()
+
+        await super().close()
+
+    async def finish_startup(self):
+        with self.startup_phase('login'):
+            await self.wait_until_ready()
+
+        with self.startup_phase('optional extensions'):
+            for extension in self.optional_extensions:
+                try:
+                    self.load_extension(extension)
+                except commands.ExtensionError:
+                    log.exception(f'Unable to load optional extension {extension}.')
+
+        phases = ', '.join(f'{name} {seconds * 1000:.0f} ms' for name, seconds in self.startup_timings.items())
+        log.info(f'Started in {sum(self.startup_timings.values()):.2f} s ({phases}).')
+
+    async def invoke(self, ctx):
+        start = time.perf_counter()
+        token = current_context.set(ctx)
+        try:
+            await super().invoke(ctx)
+        finally:
+            current_context.reset(token)
+            if isinstance(ctx, Context):
+                ctx.close_session()
+
+            if ctx.command is not None:
+                outcome = 'failed' if ctx.command_failed else 'ok'
+                metrics.command_latency.observe(time.perf_counter() - start, ctx.command.qualified_name, outcome)
+
+    def dispatch(self, event_name, *args, **kwargs):
+        # Counted here rather than in a listener, which would start a task for every presence and typing update
+        metrics.gateway_events.inc(event_name)
+        super().dispatch(event_name, *args, **kwargs)
+
+    def wants(self, message):
+        """Cheap checks that drop messages which can't be commands before any parsing happens."""
+
+        if message.author.bot:
+            return False
+
+        if not message.content.startswith(self.prefixes):
+            return False
+
+        return not (self.allowed_channels and message.guild and message.channel.id not in self.allowed_channels)
+
+    async def on_message(self, message):
+        if not self.wants(message):
             return
 
+        ctx = await self.get_context(message, cls=Context)
+
         if not ctx.valid:
             return
 
         if ctx.author.id == self.owner_id or ctx.author.id == message.guild.owner_id:
             return await self.invoke(ctx)
 
-        if message.author.id in self.using:
+        retry_after = self.limiter.get_retry_after(ctx)
+        if retry_after:
+            return await ctx.send(f'Slow down! You can use this command again in {retry_after:.0f} seconds.')
+
+        if not await self.limiter.acquire(message.author.id):
             return
 
         try:
-            self.using.append(message.author.id)
             await self.invoke(ctx)
         finally:
-            self.using.remove(message.author.id)
+            self.limiter.release(message.author.id)
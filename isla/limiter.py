@@ -0,0 +1,123 @@
+"""
+Isla Bot: Reporting functionality for a Terraria Server
+Copyright (C) 2020 Rina
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+from collections import Counter, deque
+
+from discord.ext import commands
+
+
+class UserLimiter:
+    """
+    Limit how many commands each user can have running at once.
+
+    When a user is at their limit, new commands are either rejected or queued
+    until one of their running commands finishes, depending on the policy.
+    Commands can also be given per-user cooldowns.
+    """
+
+    def __init__(self, max_concurrency=1, policy='reject', max_queue=3, queue_timeout=60.0, cooldowns=None):
+        if policy not in ('reject', 'queue'):
+            raise ValueError(f'Unknown limiter policy "{policy}", expected "reject" or "queue".')
+
+        self.max_concurrency = max_concurrency
+        self.policy = policy
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        # qualified command name -> CooldownMapping
+        self.cooldowns = {
+            name: commands.CooldownMapping.from_cooldown(rate, per, commands.BucketType.user)
+            for name, (rate, per) in (cooldowns or {}).items()
+        }
+
+        # user id -> number of running commands, only users with running commands are kept
+        self.active = {}
+        # user id -> futures of queued commands waiting for a slot
+        self.waiters = {}
+
+        self.stats = Counter()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(**(config or {}))
+
+    def get_retry_after(self, ctx):
+        """Get how long until the command can be used again, or None if it isn't on cooldown."""
+
+        mapping = self.cooldowns.get(ctx.command.qualified_name)
+        if mapping is None:
+            return None
+
+        retry_after = mapping.get_bucket(ctx.message).update_rate_limit()
+        if retry_after:
+            self.stats['cooldown'] += 1
+
+        return retry_after
+
+    async def acquire(self, user_id):
+        """Take a slot for the user, returning whether the command may run."""
+
+        running = self.active.get(user_id, 0)
+        if running < self.max_concurrency:
+            self.active[user_id] = running + 1
+            self.stats['allowed'] += 1
+            return True
+
+        waiters = self.waiters.setdefault(user_id, deque())
+        if self.policy == 'reject' or len(waiters) >= self.max_queue:
+            if not waiters:
+                del self.waiters[user_id]
+            self.stats['busy'] += 1
+            return False
+
+        future = asyncio.get_event_loop().create_future()
+        waiters.append(future)
+
+        try:
+            # release() hands its slot straight to the first waiter
+            await asyncio.wait_for(future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            try:
+                waiters.remove(future)
+            except ValueError:
+                pass
+            if not waiters:
+                self.waiters.pop(user_id, None)
+            self.stats['timeout'] += 1
+            return False
+
+        self.stats['queued'] += 1
+        return True
+
+    def release(self, user_id):
+        waiters = self.waiters.get(user_id)
+
+        while waiters:
+            future = waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                if not waiters:
+                    del self.waiters[user_id]
+                return
+
+        self.waiters.pop(user_id, None)
+
+        running = self.active.pop(user_id) - 1
+        if running:
+            self.active[user_id] = running
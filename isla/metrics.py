@@ -0,0 +1,130 @@
+"""
+Isla Bot: Reporting functionality for a Terraria Server
+Copyright (C) 2020 Rina
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import bisect
+import time
+from collections import defaultdict
+
+from aiohttp import web
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REGISTRY = []
+
+
+def format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.values = defaultdict(float)
+        REGISTRY.append(self)
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] += amount
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} counter'
+        for labels, value in sorted(self.values.items()):
+            yield f'{self.name}{format_labels(self.labels, labels)} {value}'
+
+
+class Histogram:
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket..., count above the last bucket], sum
+        self.counts = defaultdict(lambda: [0] * (len(self.buckets) + 1))
+        self.sums = defaultdict(float)
+        REGISTRY.append(self)
+
+    def observe(self, value, *labels):
+        self.counts[labels][bisect.bisect_left(self.buckets, value)] += 1
+        self.sums[labels] += value
+
+    def time(self, *labels):
+        return Timer(self, labels)
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        for labels, counts in sorted(self.counts.items()):
+            total = 0
+            for bucket, count in zip((*self.buckets, '+Inf'), counts):
+                total += count
+                yield f'{self.name}_bucket{format_labels(self.labels, labels, [("le", bucket)])} {total}'
+            yield f'{self.name}_sum{format_labels(self.labels, labels)} {self.sums[labels]}'
+            yield f'{self.name}_count{format_labels(self.labels, labels)} {total}'
+
+
+class Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+def render():
+    return '\n'.join(line for metric in REGISTRY for line in metric.render()) + '\n'
+
+
+async def serve(host='127.0.0.1', port=9100):
+    """Serve every metric at http://host:port/metrics in the Prometheus text format."""
+
+    async def handle(request):
+        return web.Response(text=render(), content_type='text/plain', charset='utf-8')
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+command_latency = Histogram('isla_command_seconds', 'Time taken by commands.', ('command', 'outcome'))
+wizard_steps = Histogram(
+    'isla_wizard_step_seconds',
+    'Time from sending a report prompt to getting a usable answer.',
+    ('step',),
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600),
+)
+pool_acquire = Histogram('isla_db_acquire_seconds', 'Time spent waiting for a database connection.')
+queries = Histogram('isla_db_query_seconds', 'Time taken by database queries.', ('method',))
+gateway_events = Counter('isla_gateway_events_total', 'Events dispatched by the client.', ('event',))
+reaction_roles = Counter('isla_reaction_roles_total', 'Reactions seen by the roles cog.', ('event', 'outcome'))
+errors = Counter('isla_command_errors_total', 'Command errors by the handler that dealt with them.', ('handler',))
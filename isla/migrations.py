@@ -0,0 +1,91 @@
+"""
+Isla Bot: Reporting functionality for a Terraria Server
+Copyright (C) 2020 Rina
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import logging
+import pathlib
+
+
+log = logging.getLogger(__name__)
+
+MIGRATIONS_PATH = pathlib.Path(__file__).resolve().parent.parent / 'sql' / 'migrations'
+
+# Arbitrary key so that two bots starting at once don't race each other
+MIGRATION_LOCK = 4_318_221
+
+# Tables the bot can't run without, checked at startup after migrating
+REQUIRED_TABLES = (
+    'staff_reports',
+    'rollbacks',
+    'terraria_one_roles',
+    'report_drafts',
+    'proof_archive',
+    'proof_phash',
+)
+
+
+def get_migrations(path=MIGRATIONS_PATH):
+    """Get (version, name, path) for every migration file, sorted by version."""
+
+    migrations = []
+    for file in path.glob('*.sql'):
+        version, _, name = file.stem.partition('_')
+        migrations.append((int(version), name, file))
+
+    return sorted(migrations)
+
+
+async def migrate(pool, path=MIGRATIONS_PATH):
+    """Apply every migration that hasn't been applied yet, each in its own transaction."""
+
+    async with pool.acquire() as connection:
+        await connection.execute('SELECT pg_advisory_lock($1);', MIGRATION_LOCK)
+        try:
+            await connection.execute(
+                '''
+                CREATE TABLE IF NOT EXISTS schema_migrations(
+                    version     int PRIMARY KEY,
+                    name        text,
+                    applied_at  timestamp DEFAULT current_timestamp
+                );
+                '''
+            )
+
+            applied = {record['version'] for record in await connection.fetch('SELECT version FROM schema_migrations;')}
+
+            for version, name, file in get_migrations(path):
+                if version in applied:
+                    continue
+
+                async with connection.transaction():
+                    await connection.execute(file.read_text(encoding='utf-8'))
+                    await connection.execute(
+                        'INSERT INTO schema_migrations (version, name) VALUES ($1, $2);', version, name
+                    )
+
+                log.info(f'Applied migration {version:04} ({name}).')
+        finally:
+            await connection.execute('SELECT pg_advisory_unlock($1);', MIGRATION_LOCK)
+
+
+async def missing_tables(pool, tables=REQUIRED_TABLES):
+    """Get the names of the tables that don't exist in the database."""
+
+    records = await pool.fetch(
+        'SELECT name FROM unnest($1::text[]) AS name WHERE to_regclass(name) IS NULL;', list(tables)
+    )
+    return [record['name'] for record in records]
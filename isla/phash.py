@@ -0,0 +1,271 @@
+"""
+Isla Bot: Reporting functionality for a Terraria Server
+Copyright (C) 2020 Rina
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import io
+import itertools
+import logging
+import math
+
+from PIL import Image
+
+
+log = logging.getLogger(__name__)
+
+# Hashes this many bits apart or fewer are treated as the same picture
+MAX_DISTANCE = 7
+
+SIZE = 32
+LOW = 8
+
+# DCT-II basis, only the LOW lowest frequencies are ever needed
+COSINES = [[math.cos(math.pi * (2 * x + 1) * u / (2 * SIZE)) for x in range(SIZE)] for u in range(LOW)]
+
+
+def phash(data):
+    """
+    Get the 64 bit perceptual hash of an image.
+
+    The image is shrunk to 32x32 greyscale and each of the 8x8 lowest DCT frequencies
+    becomes one bit, set when it's above the median. Resizing, recompressing or slightly
+    recolouring a screenshot barely changes the hash.
+    """
+
+    with Image.open(io.BytesIO(data)) as image:
+        pixels = list(image.convert('L').resize((SIZE, SIZE), Image.LANCZOS).getdata())
+
+    rows = [pixels[i : i + SIZE] for i in range(0, SIZE * SIZE, SIZE)]
+
+    # Separable 2D DCT, rows first and then columns, keeping only the low frequencies
+    row_dct = [[sum(c * p for c, p in zip(cosines, row)) for cosines in COSINES] for row in rows]
+    dct = [
+        [sum(COSINES[u][x] * row_dct[x][v] for x in range(SIZE)) for v in range(LOW)] for u in range(LOW)
+    ]
+
+    coefficients = [value for row in dct for value in row]
+    # The DC term is the overall brightness, which would skew the median
+    median = sorted(coefficients[1:])[len(coefficients[1:]) // 2]
+
+    value = 0
+    for coefficient in coefficients:
+        value = (value << 1) | (coefficient > median)
+    return value
+
+
+def to_signed(value):
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def to_unsigned(value):
+    return value & ((1 << 64) - 1)
+
+
+def distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+class MultiIndex:
+    """
+    Find hashes within a Hamming distance without comparing against every stored hash.
+
+    Each hash is split into CHUNKS 16 bit chunks, each with its own lookup table. Two hashes
+    at most max_distance apart must have some chunk at most max_distance // CHUNKS bits apart,
+    so only the buckets of those few chunk variants have to be checked.
+    """
+
+    CHUNKS = 4
+    BITS = 16
+
+    def __init__(self):
+        self.tables = [{} for _ in range(self.CHUNKS)]
+        # hash -> values
+        self.values = {}
+
+    def chunks(self, hash):
+        mask = (1 << self.BITS) - 1
+        return [(hash >> (self.BITS * i)) & mask for i in range(self.CHUNKS)]
+
+    def variants(self, chunk, radius):
+        yield chunk
+        for flips in range(1, radius + 1):
+            for bits in itertools.combinations(range(self.BITS), flips):
+                variant = chunk
+                for bit in bits:
+                    variant ^= 1 << bit
+                yield variant
+
+    def add(self, hash, value):
+        if hash not in self.values:
+            self.values[hash] = []
+            for table, chunk in zip(self.tables, self.chunks(hash)):
+                table.setdefault(chunk, []).append(hash)
+
+        self.values[hash].append(value)
+
+    def search(self, hash, max_distance=MAX_DISTANCE):
+        """Get (distance, value) for everything within max_distance of hash."""
+
+        radius = max_distance // self.CHUNKS
+        candidates = set()
+
+        for table, chunk in zip(self.tables, self.chunks(hash)):
+            for variant in self.variants(chunk, radius):
+                candidates.update(table.get(variant, ()))
+
+        found = []
+        for candidate in candidates:
+            d = distance(hash, candidate)
+            if d <= max_distance:
+                found.extend((d, value) for value in self.values[candidate])
+
+        return sorted(found)
+
+
+class ProofIndex:
+    """
+    Perceptual hashes of every archived proof image, for spotting reused screenshots.
+
+    Hashes are computed by a background worker as images are archived, stored in
+    proof_phash and kept in a multi-index in memory.
+    """
+
+    def __init__(self, bot, archiver, max_distance=MAX_DISTANCE):
+        self.bot = bot
+        self.archiver = archiver
+        self.max_distance = max_distance
+
+        self.index = MultiIndex()
+        # sha256 -> phash, or None when the file isn't an image
+        self.hashes = {}
+        self.queue = asyncio.Queue()
+        self.task = None
+
+        archiver.listeners.append(self.queue.put_nowait)
+
+    def start(self):
+        self.task = self.bot.loop.create_task(self.worker())
+
+    def close(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    def remember(self, sha256, hash):
+        if sha256 in self.hashes:
+            return
+
+        self.hashes[sha256] = hash
+        if hash is not None:
+            self.index.add(hash, sha256)
+
+    async def load(self):
+        for record in await self.bot.pool.fetch('SELECT sha256, phash FROM proof_phash;'):
+            phash = record['phash']
+            self.remember(record['sha256'], to_unsigned(phash) if phash is not None else None)
+
+        # Images archived while the index wasn't running
+        missing = await self.bot.pool.fetch(
+            '''
+            SELECT DISTINCT sha256
+                FROM proof_archive
+                WHERE sha256 IS NOT NULL
+                AND NOT EXISTS (SELECT 1 FROM proof_phash WHERE proof_phash.sha256 = proof_archive.sha256);
+            '''
+        )
+        for record in missing:
+            self.queue.put_nowait(record['sha256'])
+
+    async def worker(self):
+        try:
+            await self.load()
+        except Exception:
+            log.exception('Unable to load proof hashes.')
+
+        while True:
+            sha256 = await self.queue.get()
+            try:
+                await self.hash_file(sha256)
+            except Exception:
+                log.exception(f'Unable to hash archived proof {sha256}.')
+
+    async def hash_file(self, sha256):
+        if sha256 in self.hashes:
+            return self.hashes[sha256]
+
+        data = await self.bot.loop.run_in_executor(None, self.archiver.path_for(sha256).read_bytes)
+
+        try:
+            hash = await self.bot.loop.run_in_executor(None, phash, data)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            # Not an image Pillow can read
+            hash = None
+
+        await self.bot.pool.execute(
+            'INSERT INTO proof_phash (sha256, phash) VALUES ($1, $2) ON CONFLICT (sha256) DO NOTHING;',
+            sha256,
+            to_signed(hash) if hash is not None else None,
+        )
+
+        self.remember(sha256, hash)
+        return hash
+
+    async def find_duplicates(self, links, exclude=None):
+        """
+        Archive and hash the links straight away, and look for proof that looks the same.
+
+        Returns {link: [report id, ...]} for every link that looks like proof already on a report.
+        Reports made after the check starts, usually the one the links are for, and the exclude
+        report are left out so that proof is never flagged against its own report.
+        """
+
+        latest = await self.bot.pool.fetchval('SELECT coalesce(max(id), 0) FROM staff_reports;')
+
+        async def check(link):
+            sha256 = await self.archiver.archive(link)
+            if sha256 is None:
+                return link, []
+
+            hash = await self.hash_file(sha256)
+            if hash is None:
+                return link, []
+
+            return link, [value for _, value in self.index.search(hash, self.max_distance)]
+
+        results = await asyncio.gather(*map(check, links))
+
+        duplicates = {}
+        for link, shas in results:
+            if not shas:
+                continue
+
+            report_ids = await self.bot.pool.fetch(
+                '''
+                SELECT id
+                    FROM staff_reports
+                    WHERE image_links && (SELECT array_agg(url) FROM proof_archive WHERE sha256 = any($1))
+                      AND id <= $2
+                      AND id IS DISTINCT FROM $3
+                    ORDER BY id;
+                ''',
+                shas,
+                latest,
+                exclude,
+            )
+            if report_ids:
+                duplicates[link] = [record['id'] for record in report_ids]
+
+        return duplicates
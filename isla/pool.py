@@ -0,0 +1,199 @@
+"""
+Isla Bot: Reporting functionality for a Terraria Server
+Copyright (C) 2020 Rina
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import contextvars
+import logging
+import re
+import time
+
+import asyncpg
+
+from . import metrics
+
+
+log = logging.getLogger(__name__)
+
+# Set by Isla.invoke, so queries can be traced back to the command that made them
+current_context = contextvars.ContextVar('current_context', default=None)
+
+# Settings for asyncpg.create_pool, overridden by the pool section of config.yaml
+POOL_DEFAULTS = {
+    'min_size': 2,
+    'max_size': 10,
+    'statement_cache_size': 100,
+    'max_inactive_connection_lifetime': 300.0,
+    'command_timeout': 60.0,
+}
+
+LITERAL_PATTERN = re.compile(r"'(?:[^']|'')*'|(?<![$\w])\d+(?:\.\d+)?\b")
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def fingerprint(query):
+    """Replace literals and collapse whitespace so every run of a statement gets the same key."""
+    query = LITERAL_PATTERN.sub('?', query)
+    return WHITESPACE_PATTERN.sub(' ', query).strip().rstrip(';')
+
+
+def count_rows(method, result, args):
+    if method == 'fetch':
+        return len(result)
+    if method in ('fetchrow', 'fetchval'):
+        return int(result is not None)
+    if method == 'executemany':
+        return len(args[0])
+
+    # execute returns a status like 'INSERT 0 3' or 'UPDATE 2'
+    last = result.rsplit(' ', 1)[-1]
+    return int(last) if last.isdigit() else 0
+
+
+class QueryStats:
+    __slots__ = ('calls', 'total', 'max', 'rows', 'command')
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.command = None
+
+    @property
+    def mean(self):
+        return self.total / self.calls if self.calls else 0.0
+
+
+class QueryLog:
+    """Per-statement timings, keyed by fingerprint. Statements slower than threshold seconds are logged."""
+
+    def __init__(self, threshold=0.25):
+        self.threshold = threshold
+        self.statements = {}
+
+    def record(self, method, query, elapsed, rows):
+        metrics.queries.observe(elapsed, method)
+
+        key = fingerprint(query)
+        stats = self.statements.get(key)
+        if stats is None:
+            stats = self.statements[key] = QueryStats()
+
+        ctx = current_context.get()
+        command = ctx.command.qualified_name if ctx is not None and ctx.command is not None else None
+        stats.calls += 1
+        stats.total += elapsed
+        stats.rows += rows
+        if elapsed >= stats.max:
+            stats.max = elapsed
+            stats.command = command
+
+        if self.threshold is not None and elapsed >= self.threshold:
+            log.warning(f'Slow query ({elapsed * 1000:.0f} ms, {rows} rows) from {command or "no command"}: {key}')
+
+    def slowest(self, count=10):
+        return sorted(self.statements.items(), key=lambda item: item[1].max, reverse=True)[:count]
+
+
+class Timed:
+    """Times the query methods of the wrapped pool or connection into a QueryLog."""
+
+    def __init__(self, target, query_log):
+        self.target = target
+        self.query_log = query_log
+
+    def __getattr__(self, name):
+        return getattr(self.target, name)
+
+    async def run(self, method, query, *args, **kwargs):
+        start = time.perf_counter()
+        rows = 0
+        try:
+            result = await getattr(self.target, method)(query, *args, **kwargs)
+            rows = count_rows(method, result, args)
+            return result
+        finally:
+            self.query_log.record(method, query, time.perf_counter() - start, rows)
+
+    async def execute(self, query, *args, **kwargs):
+        return await self.run('execute', query, *args, **kwargs)
+
+    async def executemany(self, query, args, **kwargs):
+        return await self.run('executemany', query, args, **kwargs)
+
+    async def fetch(self, query, *args, **kwargs):
+        return await self.run('fetch', query, *args, **kwargs)
+
+    async def fetchrow(self, query, *args, **kwargs):
+        return await self.run('fetchrow', query, *args, **kwargs)
+
+    async def fetchval(self, query, *args, **kwargs):
+        return await self.run('fetchval', query, *args, **kwargs)
+
+
+class Connection(Timed):
+    """A connection taken from Pool, its queries go to the pool's QueryLog."""
+
+
+class AcquireContext:
+    """Times how long getting a connection takes, usable with await or async with like asyncpg's."""
+
+    def __init__(self, pool, **kwargs):
+        self.pool = pool
+        self.kwargs = kwargs
+        self.connection = None
+
+    async def acquire(self):
+        with metrics.pool_acquire.time():
+            connection = await self.pool.target.acquire(**self.kwargs)
+        return Connection(connection, self.pool.query_log)
+
+    def __await__(self):
+        return self.acquire().__await__()
+
+    async def __aenter__(self):
+        self.connection = await self.acquire()
+        return self.connection
+
+    async def __aexit__(self, *exc_info):
+        await self.pool.release(self.connection)
+
+
+class Pool(Timed):
+    """Wraps an asyncpg pool so every query and connection acquire is timed."""
+
+    def __init__(self, pool, slow_query_threshold=0.25):
+        super().__init__(pool, QueryLog(slow_query_threshold))
+
+    @classmethod
+    async def create(cls, postgres, options=None):
+        options = {**POOL_DEFAULTS, **(options or {})}
+        slow_query_threshold = options.pop('slow_query_threshold', 0.25)
+        return cls(await asyncpg.create_pool(**postgres, **options), slow_query_threshold)
+
+    def acquire(self, **kwargs):
+        return AcquireContext(self, **kwargs)
+
+    async def run(self, method, query, *args, **kwargs):
+        # Acquired here instead of inside asyncpg, so every query records how long it waited for a connection
+        async with self.acquire() as connection:
+            return await connection.run(method, query, *args, **kwargs)
+
+    async def release(self, connection, **kwargs):
+        if isinstance(connection, Connection):
+            connection = connection.target
+        await self.target.release(connection, **kwargs)
@@ -0,0 +1,82 @@
+"""
+Isla Bot: Reporting functionality for a Terraria Server
+Copyright (C) 2020 Rina
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# asyncpg prepares every statement server-side and caches it per connection, keyed by the exact query text.
+# Keeping the hot statements here means every caller sends the same text and shares one cached statement.
+
+
+def sql(query):
+    """Collapse whitespace so formatting changes never produce a second cached statement."""
+    return ' '.join(query.split())
+
+
+PROFILE = sql(
+    '''
+    SELECT id, type, blocks, punishment, happened_at, reported_at AS created_at,
+           count(*) OVER per_type AS type_count,
+           coalesce(sum(blocks) OVER per_type, 0) AS type_blocks,
+           coalesce(round(avg(blocks) OVER per_type), 0) AS type_average,
+           max(happened_at) OVER per_user AS latest_happened,
+           max(reported_at) OVER per_user AS latest_created
+        FROM staff_reports
+        WHERE lower(username) = lower($1)
+        WINDOW per_type AS (PARTITION BY type), per_user AS ()
+        ORDER BY id ASC;
+    '''
+)
+
+SEARCH = sql(
+    '''
+    SELECT username, count(*) AS reports,
+           max(greatest(
+               similarity(lower(username), lower($1)),
+               ts_rank(to_tsvector('simple', coalesce(summary, '')), plainto_tsquery('simple', $1))
+           )) AS rank
+        FROM staff_reports
+        WHERE lower(username) % lower($1)
+           OR lower(username) LIKE '%' || lower($2) || '%'
+           OR to_tsvector('simple', coalesce(summary, '')) @@ plainto_tsquery('simple', $1)
+        GROUP BY username
+        ORDER BY rank DESC, reports DESC
+        LIMIT $3;
+    '''
+)
+
+REPORT_BY_ID = sql(
+    '''
+    SELECT *, reported_at AS created_at
+        FROM staff_reports
+        WHERE id = $1;
+    '''
+)
+
+INSERT_REPORT = sql(
+    '''
+    INSERT INTO staff_reports
+        (username, type, staff, summary, blocks, image_links, happened_at, punishment)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+        RETURNING id;
+    '''
+)
+
+REACTION_ROLES = sql(
+    '''
+    SELECT message_id, emoji_id, role_id
+        FROM terraria_one_roles;
+    '''
+)
@@ -0,0 +1,92 @@
+"""
+Isla Bot: Reporting functionality for a Terraria Server
+Copyright (C) 2020 Rina
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import logging
+import re
+
+from .batching import BatchWriter
+
+
+log = logging.getLogger(__name__)
+
+# One notice per line, as posted by the Terraria server bots, e.g.
+# Rollback #1532: Rina rolled back 245 blocks by SomeGriefer
+ROLLBACK_PATTERN = (
+    r'^Rollback #(?P<id>\d+): (?P<staff>.+?) rolled back (?P<blocks>\d+) blocks? by (?P<username>.+?)\.?$'
+)
+
+
+def compile_pattern(pattern=None):
+    return re.compile(pattern or ROLLBACK_PATTERN, re.MULTILINE)
+
+
+def parse_rollbacks(content, happened_at, pattern):
+    """Turn the rollback notices in a message into (id, username, blocks, staff, happened_at) records."""
+
+    return [
+        (int(match['id']), match['username'].strip(), int(match['blocks']), match['staff'].strip(), happened_at)
+        for match in pattern.finditer(content)
+    ]
+
+
+class RollbackWriter(BatchWriter):
+    """
+    Queue parsed rollbacks and insert them in batches.
+
+    A batch is written once max_size rollbacks are queued, or max_delay seconds
+    after the first rollback in it arrived, whichever happens first.
+    """
+
+    description = 'rollbacks'
+
+    def __init__(self, bot, max_size=50, max_delay=2.0, max_retries=8):
+        super().__init__(bot, max_delay, max_retries)
+        self.max_size = max_size
+        self.queue = []
+
+    def add(self, rollbacks):
+        if not rollbacks:
+            return
+
+        self.queue.extend(rollbacks)
+
+        # While retrying, the backoff timer decides when the next write happens
+        if len(self.queue) >= self.max_size and not self.failures:
+            self.bot.loop.create_task(self.flush())
+        else:
+            self.schedule()
+
+    def take(self):
+        batch, self.queue = self.queue, []
+        return batch
+
+    def restore(self, batch):
+        self.queue[:0] = batch
+
+    def give_up(self, batch):
+        log.exception(f'Unable to save {len(batch)} rollbacks, giving up: {batch}')
+
+    async def write(self, batch):
+        await self.bot.pool.executemany(
+            '''
+            INSERT INTO rollbacks (id, username, blocks, staff, happened_at)
+                VALUES ($1, $2, $3, $4, $5)
+                ON CONFLICT (id) DO NOTHING;
+            ''',
+            batch,
+        )
@@ -0,0 +1,54 @@
+"""
+Isla Bot: Reporting functionality for a Terraria Server
+Copyright (C) 2020 Rina
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from collections import OrderedDict
+
+from . import queries
+
+
+def escape_like(text):
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class UserSearch:
+    """Ranked fuzzy search over reported usernames and summaries, remembering the most recent lookups."""
+
+    def __init__(self, bot, size=128):
+        self.bot = bot
+        self.size = size
+        self.recent = OrderedDict()
+
+    def clear(self):
+        self.recent.clear()
+
+    async def search(self, query, limit=10):
+        key = (query.lower(), limit)
+
+        try:
+            self.recent.move_to_end(key)
+            return self.recent[key]
+        except KeyError:
+            pass
+
+        results = await self.bot.pool.fetch(queries.SEARCH, query, escape_like(query), limit)
+
+        self.recent[key] = results
+        if len(self.recent) > self.size:
+            self.recent.popitem(last=False)
+
+        return results
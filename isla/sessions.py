@@ -0,0 +1,125 @@
+"""
+Isla Bot: Reporting functionality for a Terraria Server
+Copyright (C) 2020 Rina
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+from collections import deque
+
+import discord
+
+from .errors import SessionTimeout, UserCancellation
+
+
+class Session:
+    """Answers (messages and reactions) sent by one user in one channel while a command is prompting them."""
+
+    def __init__(self, router, key, timeout, ignore=None):
+        self.router = router
+        self.key = key
+        self.timeout = timeout
+        self.ignore_id = ignore.id if ignore is not None else None
+
+        # Answers sent while the bot was still busy are kept for the next prompt
+        self.events = deque(maxlen=50)
+        self.waiter = None
+
+    def feed(self, event):
+        # The message that invoked the command can be dispatched after the session opens
+        if isinstance(event, discord.Message) and event.id == self.ignore_id:
+            return
+
+        self.events.append(event)
+
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    async def next_event(self):
+        if not self.events:
+            self.waiter = asyncio.get_event_loop().create_future()
+            try:
+                await asyncio.wait_for(self.waiter, self.timeout)
+            except asyncio.TimeoutError:
+                raise SessionTimeout('User took too long to answer.') from None
+            finally:
+                self.waiter = None
+
+        return self.events.popleft()
+
+    async def wait(self, my_message, skippable):
+        """Wait for a message, or for a ✅ reaction on my_message when skippable."""
+
+        while True:
+            event = await self.next_event()
+
+            if isinstance(event, discord.Message):
+                if event.content.lower() == 'stop':
+                    raise UserCancellation('User cancelled command.')
+                return event
+
+            if event.message.id != my_message.id:
+                continue
+
+            if str(event) == '❌':
+                raise UserCancellation('User cancelled command.')
+
+            if skippable and str(event) == '✅':
+                return event
+
+    def close(self):
+        self.router.close(self)
+
+
+class SessionRouter:
+    """
+    Route incoming messages and reactions to the command prompting their author.
+
+    Sessions are keyed by (channel id, author id), so each event costs one dict lookup
+    no matter how many prompts are open, instead of a check per pending wait_for.
+    """
+
+    def __init__(self, bot, timeout=600.0):
+        self.bot = bot
+        self.timeout = timeout
+
+        # (channel id, author id) -> sessions, the newest one receives events
+        self.sessions = {}
+
+        bot.add_listener(self.on_message, 'on_message')
+        bot.add_listener(self.on_reaction_add, 'on_reaction_add')
+
+    def open(self, channel_id, author_id, ignore=None):
+        key = (channel_id, author_id)
+        session = Session(self, key, self.timeout, ignore)
+        self.sessions.setdefault(key, []).append(session)
+        return session
+
+    def close(self, session):
+        sessions = self.sessions.get(session.key)
+        if sessions and session in sessions:
+            sessions.remove(session)
+            if not sessions:
+                del self.sessions[session.key]
+
+    async def on_message(self, message):
+        sessions = self.sessions.get((message.channel.id, message.author.id))
+        if sessions:
+            sessions[-1].feed(message)
+
+    async def on_reaction_add(self, reaction, user):
+        sessions = self.sessions.get((reaction.message.channel.id, user.id))
+        if sessions:
+            sessions[-1].feed(reaction)
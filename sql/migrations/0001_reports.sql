@@ -1,8 +1,5 @@
-DROP TABLE IF EXISTS staff_reports;
-DROP TABLE IF EXISTS rollbacks;
-
 CREATE TABLE IF NOT EXISTS staff_reports(
-    id          int PRIMARY KEY,
+    id          serial PRIMARY KEY,
     username    text,
     type        text,
     punishment  text,
@@ -24,4 +21,3 @@ CREATE TABLE IF NOT EXISTS rollbacks(
     created_at  timestamp DEFAULT current_timestamp,
     filled      boolean DEFAULT FALSE
 );
-
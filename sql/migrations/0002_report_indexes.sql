@@ -0,0 +1,6 @@
+CREATE INDEX IF NOT EXISTS staff_reports_username_idx ON staff_reports (lower(username));
+CREATE INDEX IF NOT EXISTS staff_reports_type_idx ON staff_reports (type);
+CREATE INDEX IF NOT EXISTS staff_reports_happened_at_idx ON staff_reports (happened_at);
+CREATE INDEX IF NOT EXISTS staff_reports_reported_at_idx ON staff_reports (reported_at);
+
+CREATE INDEX IF NOT EXISTS rollbacks_filled_idx ON rollbacks (filled);
@@ -0,0 +1,20 @@
+CREATE TABLE IF NOT EXISTS terraria_one_roles(
+    message_id  bigint NOT NULL,
+    emoji_id    bigint,
+    role_id     bigint NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS terraria_one_roles_message_emoji_idx ON terraria_one_roles (message_id, emoji_id);
+
+-- The roles cog listens on this channel to rebuild its reaction role index
+CREATE OR REPLACE FUNCTION notify_terraria_one_roles() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('terraria_one_roles', TG_OP);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS terraria_one_roles_notify ON terraria_one_roles;
+CREATE TRIGGER terraria_one_roles_notify
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON terraria_one_roles
+    FOR EACH STATEMENT EXECUTE PROCEDURE notify_terraria_one_roles();
@@ -0,0 +1,7 @@
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS staff_reports_username_trgm_idx
+    ON staff_reports USING gin (lower(username) gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS staff_reports_summary_tsv_idx
+    ON staff_reports USING gin (to_tsvector('simple', coalesce(summary, '')));
@@ -0,0 +1,4 @@
+-- Only unfilled rollbacks are ever listed, so index just those and keep the index small
+DROP INDEX IF EXISTS rollbacks_filled_idx;
+
+CREATE INDEX IF NOT EXISTS rollbacks_unfilled_idx ON rollbacks (staff, id) WHERE NOT filled;
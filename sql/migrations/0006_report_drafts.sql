@@ -0,0 +1,5 @@
+CREATE TABLE IF NOT EXISTS report_drafts(
+    staff       text PRIMARY KEY,
+    data        jsonb NOT NULL,
+    updated_at  timestamp DEFAULT current_timestamp
+);
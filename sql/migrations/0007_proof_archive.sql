@@ -0,0 +1,10 @@
+CREATE TABLE IF NOT EXISTS proof_archive(
+    url          text PRIMARY KEY,
+    sha256       text,
+    size         int,
+    content_type text,
+    error        text,
+    archived_at  timestamp DEFAULT current_timestamp
+);
+
+CREATE INDEX IF NOT EXISTS proof_archive_sha256_idx ON proof_archive (sha256);
@@ -0,0 +1,7 @@
+CREATE TABLE IF NOT EXISTS proof_phash(
+    sha256  text PRIMARY KEY,
+    phash   bigint
+);
+
+-- Finds the reports a duplicate image was used on
+CREATE INDEX IF NOT EXISTS staff_reports_image_links_idx ON staff_reports USING gin (image_links);
@@ -0,0 +1,80 @@
+"""
+Isla Bot: Reporting functionality for a Terraria Server
+Copyright (C) 2020 Rina
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import re
+
+from hypothesis import given
+from hypothesis import strategies as st
+
+from common.regex import extract_links, time_date, time_dh, url_grabber
+
+
+# The time regexes as they were before they were tidied, which the new ones must match exactly
+OLD_TIME_DH = re.compile(r'^([0-9]|[0-9][0-9]|[0-9][0-9][0-9]|[0-9][0-9][0-9][0-9])d([0-9]|0[0-9]|1[0-9]|2[0-3])h')
+OLD_TIME_DATE = re.compile(r'^([1-9]|0[1-9]|[1-2][0-9]|3[0-1])/(1[0-2]|0?[1-9])')
+
+time_text = st.text(alphabet='0123456789dh/ ', max_size=12)
+
+host = st.from_regex(r'[a-z0-9]{1,10}(\.[a-z0-9]{1,10}){0,2}', fullmatch=True)
+path = st.from_regex(r'(/[A-Za-z0-9_%=&?.-]{0,12}[A-Za-z0-9])*', fullmatch=True)
+url = st.builds(lambda scheme, host, path: f'{scheme}://{host}{path}', st.sampled_from(['http', 'https']), host, path)
+
+# Ways a link is written in a message, none of which are part of the link
+wrappers = st.sampled_from(['{}', '<{}>', '({})', '[proof]({})', '"{}"', "'{}'", '{}.', '{},', '{}:', '{};', '{}...'])
+filler = st.text(alphabet='abc 123\n', max_size=10)
+
+
+@given(time_text)
+def test_time_dh_unchanged(text):
+    assert time_dh.findall(text) == OLD_TIME_DH.findall(text)
+
+
+@given(time_text)
+def test_time_date_unchanged(text):
+    assert time_date.findall(text) == OLD_TIME_DATE.findall(text)
+
+
+@given(url, wrappers, filler, filler)
+def test_wrapped_link(link, wrapper, before, after):
+    assert extract_links(f'{before} {wrapper.format(link)} {after}') == [link]
+
+
+@given(url, st.from_regex(r'[A-Za-z0-9_]{1,8}', fullmatch=True))
+def test_balanced_parentheses_kept(link, inner):
+    link = f'{link}/wiki/Page_({inner})'
+    assert extract_links(f'see {link}') == [link]
+    assert extract_links(f'({link})') == [link]
+
+
+@given(st.text(max_size=200))
+def test_links_are_trimmed(text):
+    for link in url_grabber.findall(text):
+        assert link in text
+        assert not re.search(r'''[.,:;"'\]\s<>]$''', link)
+        assert link.count(')') <= link.count('(')
+
+
+@given(st.lists(url, max_size=5), st.lists(url, max_size=5))
+def test_extract_links_order(text_links, attachment_links):
+    class Attachment:
+        def __init__(self, url):
+            self.url = url
+
+    text = ' and '.join(text_links)
+    expected = list(dict.fromkeys([*text_links, *attachment_links]))
+    assert extract_links(text, [Attachment(link) for link in attachment_links]) == expected
@@ -0,0 +1,134 @@
+"""
+Isla Bot: Reporting functionality for a Terraria Server
+Copyright (C) 2020 Rina
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as published
+by the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import datetime
+import pathlib
+from types import SimpleNamespace
+
+from isla.rollbacks import RollbackWriter, compile_pattern, parse_rollbacks
+
+
+FIXTURES = pathlib.Path(__file__).resolve().parent / 'fixtures' / 'rollbacks'
+
+HAPPENED_AT = datetime.datetime(2020, 5, 1, 12, 30)
+
+CUSTOM_PATTERN = r'^\[RB (?P<id>\d+)\] (?P<staff>\S+) reverted (?P<blocks>\d+) edits? from (?P<username>.+)$'
+
+
+def parse_fixture(name, pattern=None):
+    content = (FIXTURES / name).read_text(encoding='utf-8')
+    return parse_rollbacks(content, HAPPENED_AT, compile_pattern(pattern))
+
+
+def test_multi_line():
+    assert parse_fixture('multi_line.txt') == [
+        (1532, 'SomeGriefer', 245, 'Rina', HAPPENED_AT),
+        (1533, "o'neil", 1, 'Rina', HAPPENED_AT),
+        (1534, 'Big Builder 99', 12000, 'Terra Mod', HAPPENED_AT),
+    ]
+
+
+def test_non_matching_lines_are_skipped():
+    assert [rollback[0] for rollback in parse_fixture('mixed.txt')] == [2001, 2003]
+
+
+def test_duplicate_ids_are_kept_for_the_database():
+    # The insert ignores ids it already has, so parsing keeps every notice
+    assert [rollback[0] for rollback in parse_fixture('duplicates.txt')] == [3100, 3100, 3101]
+
+
+def test_custom_pattern():
+    assert parse_fixture('custom.txt', CUSTOM_PATTERN) == [
+        (77, 'BadActor', 640, '298516367311765505', HAPPENED_AT),
+        (78, 'Another One', 5, '298516367311765505', HAPPENED_AT),
+    ]
+
+
+class StubPool:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.batches = []
+
+    async def executemany(self, query, batch):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('database unavailable')
+        self.batches.append(list(batch))
+
+
+def run_writer(test, **kwargs):
+    async def main():
+        pool = StubPool(kwargs.pop('failures', 0))
+        bot = SimpleNamespace(loop=asyncio.get_running_loop(), pool=pool)
+        writer = RollbackWriter(bot, **kwargs)
+        await test(writer)
+        return pool, writer
+
+    return asyncio.run(main())
+
+
+def test_writer_flushes_when_full():
+    rollbacks = parse_fixture('multi_line.txt')
+
+    async def test(writer):
+        writer.add(rollbacks)
+        await asyncio.sleep(0)
+
+    pool, writer = run_writer(test, max_size=3, max_delay=60)
+    assert pool.batches == [rollbacks]
+    assert writer.queue == []
+
+
+def test_writer_flushes_after_delay():
+    rollbacks = parse_fixture('mixed.txt')
+
+    async def test(writer):
+        writer.add(rollbacks[:1])
+        writer.add(rollbacks[1:])
+        await asyncio.sleep(0)
+        assert writer.queue == rollbacks
+        await asyncio.sleep(0.05)
+
+    pool, writer = run_writer(test, max_size=50, max_delay=0.01)
+    assert pool.batches == [rollbacks]
+
+
+def test_writer_retries_failed_batches():
+    first, second = parse_fixture('multi_line.txt'), parse_fixture('mixed.txt')
+
+    async def test(writer):
+        writer.add(first)
+        await asyncio.sleep(0.03)
+        writer.add(second)
+        await asyncio.sleep(0.2)
+
+    pool, writer = run_writer(test, failures=2, max_size=50, max_delay=0.01)
+    assert pool.batches == [first + second]
+    assert writer.failures == 0
+
+
+def test_writer_gives_up():
+    async def test(writer):
+        writer.add(parse_fixture('duplicates.txt'))
+        await asyncio.sleep(0.1)
+
+    pool, writer = run_writer(test, failures=10, max_size=50, max_delay=0.01, max_retries=1)
+    assert pool.batches == []
+    assert writer.queue == []
+    assert writer.timer is None